@@ -0,0 +1,78 @@
+import sys
+import time
+import threading
+import tracemalloc
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import instaloader
+
+from session_pool import create_loader
+
+# میکروبنچمارک هزینه هر پروفایل روی همان مسیری که Profile.from_username درخواست صفحه را می‌فرستد
+# (get_anonymous_session و سپس get): Instaloader جدید برای هر پروفایل، Instaloader ماندگار بدون استخر و create_loader.
+# بدون آرگومان یک سرور HTTP محلی با keep-alive راه‌اندازی می‌شود؛ با یک آدرس (ترجیحاً https) همان آدرس زمان‌گیری می‌شود.
+
+ITERATIONS = 50
+PAGE = b"<html><body>" + b"x" * 20000 + b"</body></html>"
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive تا استفاده دوباره از اتصال قابل اندازه‌گیری باشد
+    disable_nagle_algorithm = True  # بدون آن هدر و بدنه جداگانه ارسال می‌شوند و delayed ACK روی اتصال ماندگار ۴۰ms اضافه می‌کند
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+
+def start_local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def fetch_page(context, url):
+    """همان الگوی get_page_data در Instaloader: سشن ناشناس برای هر درخواست که پس از آن بسته می‌شود"""
+    with context.get_anonymous_session() as session:
+        return session.get(url, allow_redirects=False).status_code
+
+
+def per_profile_loader(url):
+    """روش قبلی: ساخت Instaloader جدید برای هر پروفایل"""
+    return fetch_page(instaloader.Instaloader(sleep=False).context, url)
+
+
+def measure(label, func, iterations=ITERATIONS):
+    func()  # گرم کردن (و در حالت استخر، باز کردن اولین اتصال)
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<32} {elapsed / iterations * 1000:8.3f} ms/profile   peak {peak / 1024:8.1f} KiB")
+    return elapsed
+
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else start_local_server()
+    print(f"URL: {url}")
+
+    plain = instaloader.Instaloader(sleep=False).context
+    pooled = create_loader("benchmark").context
+
+    before = measure("new Instaloader per profile", lambda: per_profile_loader(url))
+    unpooled = measure("shared Instaloader, no pool", lambda: fetch_page(plain, url))
+    after = measure("create_loader (pooled)", lambda: fetch_page(pooled, url))
+    print(f"speedup vs new Instaloader: {before / after:.1f}x, vs shared without pool: {unpooled / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import sqlite3
+
+import pandas as pd
+
+from similarity import DIGITS, find_root, union
+
+# نرمال‌سازی ستونی شماره تماس و ایمیل کسب‌وکار در out.csv و ساخت کلیدهای یکتا.
+# هر کلید (phone:+98... یا email:...) در یک نمایه SQLite به مجموعه instagramID ها نگاشت می‌شود؛
+# نمایه بین اجراها باقی می‌ماند، پس تکراری‌های دقیق در همه اجراها با یک جست‌وجوی O(1) پیدا می‌شوند.
+# این گروه‌بندی دقیق گذر ارزان پیش از تشخیص شباهت MinHash (similarity.py) است.
+
+csv_file = 'out.csv'
+id_column = 'instagramID'
+phone_column = 'Business Phone Number'
+email_column = 'Business Email'
+index_file = 'contact_index.sqlite'
+groups_file = 'contact_groups.csv'
+chunk_size = 100000
+
+PLACEHOLDERS = ["ندارد", "none", "nan", "null", "-", ""]
+EMAIL_PATTERN = r"[^@\s]+@[^@\s]+\.[^@\s]+"
+
+
+def normalize_phones(phones):
+    """
+    کلید کانونی شماره‌ها با عملیات رشته‌ای pandas روی کل ستون: ارقام فارسی/عربی به لاتین،
+    فقط اولین شماره هر خانه، پیشوندهای +98، 0098، 98 و 0 حذف و به +98 تبدیل؛ شماره‌های خارجی با + حفظ می‌شوند.
+    مقدار نامعتبر یا «ندارد» به NA تبدیل می‌شود.
+    """
+    phones = phones.astype("string").str.translate(DIGITS).str.strip()
+    phones = phones.mask(phones.str.lower().isin(PLACEHOLDERS).fillna(True))
+    phones = phones.str.split(r"[,/;؛|]", n=1, regex=True).str[0]
+    phones = phones.str.replace(r"[^\d+]", "", regex=True).str.replace(r"^00", "+", regex=True)
+    phones = phones.str.replace(r"^\+98", "", regex=True)
+
+    foreign = phones.str.startswith("+").fillna(False).astype(bool)
+    national = phones.str.replace(r"^98(?=\d{10}$)", "", regex=True).str.lstrip("0")
+    valid = national.str.fullmatch(r"\d{7,11}").fillna(False).astype(bool) & ~foreign
+    valid_foreign = phones.str.fullmatch(r"\+\d{8,15}").fillna(False).astype(bool)
+    keys = ("+98" + national).where(~foreign, phones)
+    return keys.where(valid | valid_foreign)
+
+
+def normalize_emails(emails):
+    """کلید کانونی ایمیل‌ها: حروف کوچک، بدون فاصله و ارقام لاتین؛ مقدار نامعتبر یا «ندارد» به NA تبدیل می‌شود"""
+    emails = emails.astype("string").str.translate(DIGITS).str.strip().str.lower()
+    emails = emails.mask(emails.isin(PLACEHOLDERS).fillna(True))
+    return emails.where(emails.str.fullmatch(EMAIL_PATTERN).fillna(False).astype(bool))
+
+
+def canonical_contacts(frame):
+    """کلیدهای کانونی شماره و ایمیل یک دسته از ردیف‌ها"""
+    return pd.DataFrame({
+        id_column: frame[id_column].astype("string"),
+        "phone_key": normalize_phones(frame[phone_column]),
+        "email_key": normalize_emails(frame[email_column]),
+    })
+
+
+def contact_keys(contacts):
+    """جدول (key، instagram_id) یکتا از خروجی canonical_contacts"""
+    parts = [
+        pd.DataFrame({"key": "phone:" + contacts["phone_key"], "instagram_id": contacts[id_column]}),
+        pd.DataFrame({"key": "email:" + contacts["email_key"], "instagram_id": contacts[id_column]}),
+    ]
+    return pd.concat(parts, ignore_index=True).dropna().drop_duplicates()
+
+
+class ContactIndex:
+    """
+    نمایه ماندگار کلید ← مجموعه instagramID ها در SQLite که هنگام باز شدن کامل در یک دیکشنری بارگذاری می‌شود
+    تا جست‌وجوی هر کلید O(1) باشد.
+    """
+
+    def __init__(self, db_file):
+        self.connection = sqlite3.connect(db_file)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS contact_keys (key TEXT, instagram_id TEXT, PRIMARY KEY (key, instagram_id)) "
+            "WITHOUT ROWID"
+        )
+        self.connection.commit()
+        self.ids = {}
+        for key, instagram_id in self.connection.execute("SELECT key, instagram_id FROM contact_keys"):
+            self.ids.setdefault(key, set()).add(instagram_id)
+
+    def add(self, keys):
+        """افزودن جدول (key، instagram_id)؛ تعداد جفت‌های تازه برگردانده می‌شود"""
+        new_pairs = [
+            (key, instagram_id) for key, instagram_id in zip(keys["key"], keys["instagram_id"])
+            if instagram_id not in self.ids.get(key, ())
+        ]
+        for key, instagram_id in new_pairs:
+            self.ids.setdefault(key, set()).add(instagram_id)
+        self.connection.executemany("INSERT OR IGNORE INTO contact_keys (key, instagram_id) VALUES (?, ?)", new_pairs)
+        self.connection.commit()
+        return len(new_pairs)
+
+    def lookup(self, key):
+        return self.ids.get(key, set())
+
+    def duplicate_keys(self):
+        """کلیدهایی که به بیش از یک حساب اشاره می‌کنند"""
+        return {key: ids for key, ids in self.ids.items() if len(ids) > 1}
+
+    def groups(self):
+        """شناسه گروه هر حساب: حساب‌هایی که در شماره یا ایمیل مشترک‌اند یک گروه می‌شوند (کوچک‌ترین شناسه)"""
+        parent = {}
+        for ids in self.duplicate_keys().values():
+            first, *others = ids
+            for other in others:
+                union(parent, first, other)
+        return {instagram_id: find_root(parent, instagram_id) for instagram_id in parent}
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    index = ContactIndex(index_file)
+    frames = []
+    new_pairs = 0
+    try:
+        columns = [id_column, phone_column, email_column]
+        for chunk in pd.read_csv(csv_file, usecols=columns, dtype=str, chunksize=chunk_size):
+            contacts = canonical_contacts(chunk.dropna(subset=[id_column]))
+            new_pairs += index.add(contact_keys(contacts))
+            frames.append(contacts)
+
+        contacts = pd.concat(frames, ignore_index=True).drop_duplicates(subset=[id_column])
+        groups = index.groups()
+        contacts["contact_group"] = contacts[id_column].map(groups)
+        contacts.to_csv(groups_file, index=False)
+
+        duplicates = index.duplicate_keys()
+        grouped = contacts["contact_group"].notna()
+        collapsed = grouped.sum() - contacts.loc[grouped, "contact_group"].nunique()
+        print(f"{len(contacts)} حساب، {new_pairs} کلید تازه، {len(index.ids)} کلید در نمایه، "
+              f"{len(duplicates)} کلید مشترک؛ {collapsed} حساب تکراری در {contacts['contact_group'].nunique()} گروه.")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
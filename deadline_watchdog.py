@@ -0,0 +1,51 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class DeadlineWatchdog:
+    """
+    ناظر مشترک مهلت درخواست‌ها با یک نخ برای همه کارگرها (به‌جای یک Timer برای هر درخواست).
+    هر درخواست مهلت خود را ثبت و در پایان لغو می‌کند؛ اگر مهلت زودتر برسد تابع مربوط یک بار صدا زده می‌شود.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.cancelled = set()
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="deadline-watchdog", daemon=True)
+        self.thread.start()
+
+    def watch(self, seconds, callback, *args):
+        """ثبت مهلت و برگرداندن شناسه‌ای برای لغو آن"""
+        token = next(self.counter)
+        with self.condition:
+            heapq.heappush(self.heap, (time.monotonic() + seconds, token, callback, args))
+            self.condition.notify()
+        return token
+
+    def cancel(self, token):
+        with self.condition:
+            self.cancelled.add(token)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.heap:
+                    self.condition.wait()
+                deadline, token, callback, args = self.heap[0]
+                wait = deadline - time.monotonic()
+                if wait > 0 and token not in self.cancelled:
+                    self.condition.wait(wait)
+                    continue
+                heapq.heappop(self.heap)
+                if token in self.cancelled:
+                    self.cancelled.discard(token)
+                    continue
+            try:
+                callback(*args)
+            except Exception as e:
+                logging.error(f"خطا در اجرای تابع مهلت: {e}")
@@ -1,71 +1,238 @@
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import random
 import os
 import time
 import json
 
+from image_store import FileStore, ContentStore
+from image_archive import ArchiveStore
+from image_metadata import ImageMetadata
+from download_state import DownloadTracker
+from thumbnailer import Thumbnailer
+
 # فایل CSV و ستون‌ها
 csv_file = 'out.csv'  # مسیر فایل CSV
 url_column = 'imageUrl'  # ستون لینک‌ها
 name_column = 'instagramID'  # ستون نام فایل‌ها
 output_folder = 'images1/'  # پوشه ذخیره‌سازی تصاویر
-config_file = 'imageconfig.json'  # فایل کانفیگ برای ذخیره‌سازی وضعیت دانلود
-
-# ایجاد پوشه برای ذخیره تصاویر
-os.makedirs(output_folder, exist_ok=True)
-
-# خواندن لینک‌ها و نام‌ها از CSV
-df = pd.read_csv(csv_file)
-
-# حذف ردیف‌هایی که لینک یا نام خالی دارند
-df = df.dropna(subset=[url_column, name_column])
-
-# تبدیل ستون نام به رشته و حذف `.0` اگر وجود داشته باشد
-df[name_column] = df[name_column].astype(str).str.replace(r'\.0$', '', regex=True)
-
-# خواندن وضعیت دانلود قبلی از فایل کانفیگ اگر وجود داشته باشد
-if os.path.exists(config_file):
-    with open(config_file, 'r') as f:
-        config_data = json.load(f)
-    last_downloaded_index = config_data.get('last_downloaded_index', -1)  # مقدار پیش‌فرض -1 برای شروع از ابتدا
-else:
-    last_downloaded_index = -1
-
-# دانلود تصاویر
-for index, row in df.iterrows():
-    if index <= last_downloaded_index:
-        # اگر این تصویر قبلاً دانلود شده است، ادامه بده
-        continue
-    
-    url = row[url_column]
-    file_name = row[name_column]
-    
-    # مسیر کامل فایل
-    file_path = os.path.join(output_folder, f"{file_name}.jpg")
-
-    if os.path.exists(file_path):
-        # اگر تصویر قبلاً دانلود شده، آن را رد کن
-        print(f"Skipped (already downloaded): {file_name}")
-        continue
+config_file = 'imageconfig.json'  # ایندکس قدیمی وضعیت دانلود (فقط خوانده می‌شود)
+state_file = 'imagestate.sqlite'  # شناسه‌های دانلودشده و ناموفق برای ادامه دقیق دانلود
+metadata_file = 'imagemeta.sqlite'  # متادیتای ETag/Last-Modified هر تصویر
 
-    try:
-        # دانلود تصویر با timeout و جلوگیری از توقف در صورت خطا
-        response = requests.get(url, stream=True, timeout=10)
-        if response.status_code == 200:
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-            print(f"Downloaded: {file_name}")
+# تنظیمات دانلود همزمان
+max_workers = 16  # حداکثر تعداد دانلود همزمان
+max_per_host = 8  # حداکثر دانلود همزمان از یک میزبان (CDN)
+max_retries = 3  # تعداد تلاش مجدد برای هر تصویر
+retry_backoff = 1.0  # پایه تاخیر نمایی بین تلاش‌ها (ثانیه)
+progress_every = 100  # چاپ خلاصه پیشرفت پس از این تعداد تصویر
+chunk_size = 50000  # تعداد ردیف‌های CSV در هر تکه خواندن
+storage_mode = 'files'  # 'files' برای یک فایل به ازای هر شناسه، 'cas' برای ذخیره یکتا بر اساس هش محتوا، 'archive' برای شاردها
+archive_shard_size = 1024 ** 3  # حداکثر اندازه هر شارد در حالت archive (بایت)
+refresh_mode = False  # True: تصاویر موجود با درخواست شرطی بررسی و فقط در صورت تغییر دوباره نوشته می‌شوند
+retry_failed_mode = False  # True: فقط شناسه‌هایی که قبلاً ناموفق بوده‌اند دوباره دانلود می‌شوند
+download_chunk_size = 65536  # اندازه بافر نوشتن هر تکه از پاسخ (بایت)
+
+# مرحله اختیاری ساخت تصویر کوچک WebP پس از دانلود (نیازمند Pillow)
+thumbnail_sizes = ()  # مثلاً (320, 150)؛ خالی یعنی غیرفعال
+thumbnail_quality = 80  # کیفیت WebP
+thumbnail_folder = 'thumbs/'  # خروجی در thumbs/<اندازه>/{instagramID}.webp
+thumbnail_workers = None  # تعداد پردازه‌ها؛ None یعنی همه هسته‌ها
+
+# کدهای HTTP که ارزش تلاش مجدد دارند
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class HostLimiter:
+    """محدود کردن تعداد دانلود همزمان از هر میزبان با یک سمافور جداگانه"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.limit)
+            return self.semaphores[host]
+
+
+def create_session():
+    """یک سشن مشترک با استخر اتصال به اندازه تعداد کارگرها"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def create_store():
+    if storage_mode == 'archive':
+        return ArchiveStore(output_folder, archive_shard_size)
+    if storage_mode == 'cas':
+        return ContentStore(output_folder)
+    return FileStore(output_folder)
+
+
+def download_image(session, host_limiter, store, metadata, url, file_name, conditional=False):
+    """
+    دانلود یک تصویر با تلاش مجدد و تاخیر تصادفی.
+    خروجی: (وضعیت، علت) که وضعیت 'downloaded'، 'not_modified' (پاسخ 304 در درخواست شرطی) یا 'failed' است
+    """
+    headers = metadata.conditional_headers(file_name) if conditional else {}
+    for attempt in range(1, max_retries + 1):
+        try:
+            with host_limiter.get(url):
+                response = session.get(url, stream=True, timeout=10, headers=headers)
+                if response.status_code == 200:
+                    size = store.save(file_name, response.iter_content(download_chunk_size))
+                    metadata.record(file_name, url, response, size)
+                    return 'downloaded', None
+                response.close()
+            if response.status_code == 304:
+                metadata.touch(file_name, url)
+                return 'not_modified', None
+            if response.status_code not in RETRY_STATUS_CODES:
+                print(f"Failed to download (HTTP {response.status_code}): {url}")
+                return 'failed', f"HTTP {response.status_code}"
+            error = f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            error = e
+
+        if attempt < max_retries:
+            # تاخیر نمایی با jitter تا درخواست‌های ناموفق همزمان دوباره با هم برنگردند
+            time.sleep(retry_backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+    print(f"Error downloading {url}: {error}")
+    return 'failed', str(error)
+
+
+def load_legacy_index():
+    """ایندکس قدیمی imageconfig.json فقط خوانده می‌شود تا ردیف‌های قبلاً پردازش‌شده دوباره بررسی نشوند"""
+    if os.path.exists(config_file):
+        with open(config_file, 'r') as f:
+            config_data = json.load(f)
+        return config_data.get('last_downloaded_index', -1)  # مقدار پیش‌فرض -1 برای شروع از ابتدا
+    return -1
+
+
+def read_rows(skip_ids, last_downloaded_index):
+    """
+    خواندن جریانی CSV به‌صورت تکه‌های ثابت و فقط با دو ستون لازم.
+    حذف ردیف‌های خالی، حذف `.0` از شناسه و رد کردن شناسه‌های تمام‌شده به‌صورت برداری روی هر تکه انجام می‌شود.
+    """
+    reader = pd.read_csv(
+        csv_file,
+        usecols=[url_column, name_column],
+        dtype={url_column: str, name_column: str},
+        chunksize=chunk_size,
+    )
+    for chunk in reader:
+        # حذف ردیف‌هایی که لینک یا نام خالی دارند
+        chunk = chunk.dropna(subset=[url_column, name_column])
+        # حذف `.0` از شناسه‌هایی که قبلاً به‌صورت عدد اعشاری ذخیره شده‌اند
+        names = chunk[name_column].str.replace(r'\.0$', '', regex=True)
+        keep = chunk.index > last_downloaded_index
+        if skip_ids is not None:
+            keep &= ~names.isin(skip_ids)
+        yield from zip(chunk.index[keep], chunk[url_column][keep], names[keep])
+
+
+def read_failed_rows(failed_ids):
+    """فقط ردیف‌های شناسه‌های ناموفق قبلی برای تلاش دوباره"""
+    for index, url, file_name in read_rows(None, -1):
+        if file_name in failed_ids:
+            yield index, url, file_name
+
+
+def main():
+    # ایجاد پوشه برای ذخیره تصاویر
+    os.makedirs(output_folder, exist_ok=True)
+    if storage_mode == 'archive' and thumbnail_sizes:
+        raise ValueError("thumbnail generation needs per-image files; it is not available in archive mode")
+
+    session = create_session()
+    host_limiter = HostLimiter(max_per_host)
+    store = create_store()  # پوشه خروجی همین‌جا یک بار اسکن می‌شود
+    metadata = ImageMetadata(metadata_file)
+    tracker = DownloadTracker(state_file, on_flush=store.commit)  # ذخیره‌گاه پیش از هر دسته وضعیت ماندگار می‌شود
+    thumbnailer = Thumbnailer(thumbnail_folder, thumbnail_sizes, thumbnail_quality, thumbnail_workers) if thumbnail_sizes else None
+
+    # انتخاب ردیف‌ها: تلاش دوباره ناموفق‌ها، بررسی شرطی همه، یا ردیف‌هایی که نه دانلود شده‌اند و نه قبلاً ناموفق بوده‌اند
+    if retry_failed_mode:
+        rows = read_failed_rows(set(tracker.failed))
+    elif refresh_mode:
+        rows = read_rows(None, -1)
+    else:
+        rows = read_rows(tracker.done | tracker.failed | store.present, load_legacy_index())
+
+    stats = {"downloaded": 0, "not_modified": 0, "skipped": 0, "failed": 0}
+    lock = threading.Lock()
+    # سقف کارهای ارسال‌شده به صف تا حافظه با بزرگ شدن out.csv ثابت بماند
+    in_flight = threading.BoundedSemaphore(max_workers * 4)
+    active_ids = set()  # شناسه‌های در حال دانلود تا شناسه تکراری همین اجرا همزمان دوباره دانلود نشود
+    started = time.time()
+
+    def handle_result(future, url, file_name):
+        with lock:
+            active_ids.discard(file_name)
+        in_flight.release()
+        try:
+            status, reason = future.result()
+        except Exception as e:
+            status, reason = 'failed', str(e)
+            print(f"Error saving {file_name}: {e}")
+
+        if status == 'failed':
+            tracker.mark_failed(file_name, url, reason)
         else:
-            print(f"Failed to download (HTTP {response.status_code}): {url}")
-        
-        # ذخیره وضعیت دانلود در فایل کانفیگ
-        with open(config_file, 'w') as f:
-            json.dump({'last_downloaded_index': index}, f)
-
-        # تأخیر 2 ثانیه‌ای بین درخواست‌ها
-        time.sleep(2)
-    except requests.exceptions.RequestException as e:
-        # ثبت خطا و ادامه پردازش
-        print(f"Error downloading {url}: {e}")
-        continue
+            tracker.mark_done(file_name)
+            if status == 'downloaded':
+                print(f"Downloaded: {file_name}")
+                if thumbnailer:
+                    thumbnailer.submit(store.path(file_name), file_name)
+
+        with lock:
+            stats[status] += 1
+            completed = stats["downloaded"] + stats["not_modified"] + stats["failed"]
+            if completed % progress_every == 0:
+                elapsed = time.time() - started
+                print(f"Progress: {completed} done ({completed / elapsed * 60:.0f} images/min) {stats}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for index, url, file_name in rows:
+                with lock:
+                    exists = store.exists(file_name)  # زیر قفل تا دانلودی که همین حالا تمام شده دیده شود
+                    # شناسه تکراری در همین اجرا که قبلاً دانلود شده یا هنوز در حال دانلود است
+                    if file_name in active_ids or (exists and not (refresh_mode or retry_failed_mode)):
+                        stats["skipped"] += 1
+                        continue
+                    active_ids.add(file_name)
+
+                # در حالت به‌روزرسانی، تصویر موجود فقط با درخواست شرطی دوباره بررسی می‌شود
+                in_flight.acquire()
+                future = executor.submit(download_image, session, host_limiter, store, metadata, url, file_name, exists)
+                future.add_done_callback(lambda f, url=url, file_name=file_name: handle_result(f, url, file_name))
+    finally:
+        # حتی با Ctrl-C: ابتدا ذخیره‌گاه (از طریق on_flush ردیاب) و سپس شناسه‌های تمام‌شده ثبت می‌شوند
+        tracker.close()
+        if thumbnailer:
+            thumbnailer.close()
+        store.close()
+        metadata.close()
+    elapsed = time.time() - started
+    print(f"Done in {elapsed:.0f}s: {stats}, {len(tracker.failed)} failed IDs recorded for retry")
+    if store.report():
+        print(store.report())
+    if thumbnailer:
+        print(thumbnailer.report())
+
+
+if __name__ == "__main__":
+    main()
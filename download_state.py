@@ -0,0 +1,70 @@
+import time
+import sqlite3
+import threading
+
+
+class DownloadTracker:
+    """
+    وضعیت ادامه دانلود بر اساس شناسه تصویر به‌جای یک ایندکس بالاترین ردیف.
+    شناسه‌های تمام‌شده و ناموفق در SQLite نگه‌داری و به‌صورت دسته‌ای نوشته می‌شوند،
+    بنابراین تکمیل خارج از ترتیب دانلودهای همزمان دقیقاً ثبت می‌شود.
+    on_flush پیش از نوشتن هر دسته صدا زده می‌شود تا ذخیره‌گاه تصاویر زودتر ماندگار شود
+    و شناسه‌ای که تصویرش هنوز ثبت نشده تمام‌شده علامت نخورد.
+    """
+
+    def __init__(self, db_file, flush_every=500, on_flush=None):
+        self.flush_every = flush_every
+        self.on_flush = on_flush
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS done (id TEXT PRIMARY KEY)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS failed (id TEXT PRIMARY KEY, url TEXT, reason TEXT, failed_at REAL)"
+        )
+        self.connection.commit()
+
+        self.done = {row[0] for row in self.connection.execute("SELECT id FROM done")}
+        self.failed = {row[0] for row in self.connection.execute("SELECT id FROM failed")}
+        self.pending_done = []
+        self.pending_failed = []
+
+    def mark_done(self, file_name):
+        with self.lock:
+            self.done.add(file_name)
+            self.failed.discard(file_name)
+            self.pending_done.append((file_name,))
+            self._maybe_flush_locked()
+
+    def mark_failed(self, file_name, url, reason):
+        with self.lock:
+            self.failed.add(file_name)
+            self.pending_failed.append((file_name, url, reason, time.time()))
+            self._maybe_flush_locked()
+
+    def _maybe_flush_locked(self):
+        if len(self.pending_done) + len(self.pending_failed) >= self.flush_every:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self.on_flush and (self.pending_done or self.pending_failed):
+            self.on_flush()
+        if self.pending_done:
+            self.connection.executemany("INSERT OR IGNORE INTO done (id) VALUES (?)", self.pending_done)
+            self.connection.executemany("DELETE FROM failed WHERE id = ?", self.pending_done)
+        if self.pending_failed:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO failed (id, url, reason, failed_at) VALUES (?, ?, ?, ?)", self.pending_failed
+            )
+        self.connection.commit()
+        self.pending_done = []
+        self.pending_failed = []
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def close(self):
+        with self.lock:
+            self._flush_locked()
+            self.connection.close()
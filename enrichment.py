@@ -0,0 +1,434 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+import pandas as pd
+
+from llm_client import (ChatClient, DEFAULT_BASE_URL, SYSTEM_PROMPT, BATCH_SYSTEM_PROMPT,
+                        DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS, complete_rows, estimate_tokens)
+from response_cache import ResponseCache, cache_key
+from enrichment_metrics import EnrichmentMetrics, DEFAULT_TOKEN_PRICES, token_cost, format_enrichment_metrics
+
+# موتور غنی‌سازی CSV با مدل زبانی (AvalAI) بدون وابستگی به رابط گرافیکی.
+# رابط Tk در «import openai.py» و خط فرمان پایین همین فایل هر دو از run_enrichment استفاده می‌کنند.
+
+# فایل‌های تنظیمات
+SETTINGS_FILE = "settings.json"
+API_KEY_FILE = "api_key.txt"
+
+CREDIT_PATH = "/user/credit"
+
+# تعداد ردیف‌هایی که پیش از نوشتن در فایل خروجی جمع می‌شوند
+WRITE_BATCH_SIZE = 20
+
+# تعداد ردیف‌های ورودی که در هر مرحله از فایل CSV خوانده می‌شوند (کلید chunk_size در settings.json)
+DEFAULT_CHUNK_SIZE = 5000
+
+# تعداد پیش‌فرض درخواست‌های همزمان به API (کلید max_in_flight در settings.json)
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# حالت دسته‌ای: تعداد ردیف در هر درخواست (batch_size، ۱ یعنی خاموش) و سقف تخمینی توکن پرامپت هر درخواست (batch_token_budget)
+DEFAULT_BATCH_SIZE = 1
+DEFAULT_BATCH_TOKEN_BUDGET = 3000
+
+# کش پاسخ‌ها (کلیدهای cache_file، cache_ttl_days و cache_max_entries در settings.json)
+DEFAULT_CACHE_FILE = "responses.sqlite"
+
+# فایل متریک توکن، هزینه و تاخیر (کلید metrics_file در settings.json)
+DEFAULT_METRICS_FILE = "enrichment_metrics.jsonl"
+
+DEFAULT_SETTINGS = {
+    "input_file": "",
+    "output_file": "",
+    "input_column": "",
+    "output_column": "",
+    "prompt_template": "",
+    "model": "gpt-3.5-turbo",
+    "max_rows": 0,
+    "last_processed_line": 0,
+}
+
+
+# مدیریت تنظیمات
+def save_settings(settings, settings_file=SETTINGS_FILE):
+    """ذخیره تنظیمات در فایل JSON"""
+    with open(settings_file, "w") as file:
+        json.dump(settings, file)
+
+def load_settings(settings_file=SETTINGS_FILE):
+    """بارگذاری تنظیمات از فایل JSON"""
+    try:
+        with open(settings_file, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return dict(DEFAULT_SETTINGS)
+
+# مدیریت کلید API
+def save_api_key(api_key, api_key_file=API_KEY_FILE):
+    """ذخیره API Key در فایل"""
+    with open(api_key_file, "w") as file:
+        file.write(api_key)
+
+def load_api_key(api_key_file=API_KEY_FILE):
+    """خواندن API Key از فایل"""
+    try:
+        with open(api_key_file, "r") as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return ""
+
+# دریافت موجودی
+def get_user_credit(api_key, base_url=DEFAULT_BASE_URL):
+    """دریافت موجودی از API"""
+    if not api_key:
+        return "API Key وارد نشده است."
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+    try:
+        response = requests.get(base_url.rstrip("/") + CREDIT_PATH, headers=headers, timeout=(10, 30))
+        if response.status_code == 200:
+            return response.json().get("credit", "نامشخص")
+        else:
+            return f"خطا: {response.status_code}"
+    except Exception as e:
+        return f"خطا در ارتباط با API: {e}"
+
+# ارسال درخواست به API AvalAI
+def create_client(api_key, settings, max_in_flight=DEFAULT_MAX_IN_FLIGHT, observe=None):
+    """ساخت کلاینت chat با استخر اتصال؛ آدرس پایه از کلید base_url تنظیمات خوانده می‌شود تا با سرور محلی قابل آزمایش باشد"""
+    return ChatClient(
+        api_key,
+        base_url=settings.get("base_url") or DEFAULT_BASE_URL,
+        max_in_flight=max_in_flight,
+        max_retries=int(settings.get("max_retries", 5)),
+        observe=observe,
+    )
+
+def open_cache(settings):
+    return ResponseCache(
+        settings.get("cache_file", DEFAULT_CACHE_FILE),
+        ttl_seconds=float(settings.get("cache_ttl_days", 30)) * 24 * 3600,
+        max_entries=int(settings.get("cache_max_entries", 200000)),
+    )
+
+# خواندن ورودی
+def read_input_columns(input_file):
+    return list(pd.read_csv(input_file, nrows=0).columns)
+
+def plan_run(input_file, input_column, prompt_template, start_line, retry_lines, done_lines, max_rows, batch_size,
+             chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    تخمین پیش از اجرا فقط با خواندن ستون ورودی: تعداد کل ردیف‌ها، ردیف‌هایی که ارسال می‌شوند،
+    توکن‌های تخمینی پرامپت (با پرامپت سیستم هر درخواست) و سقف توکن‌های خروجی. ردیف‌های موجود در کش هم شمرده می‌شوند.
+    """
+    total_rows = 0
+    rows = 0
+    prompt_tokens = 0
+    for chunk in pd.read_csv(input_file, usecols=[input_column], chunksize=chunk_size):
+        for position, text in enumerate(chunk[input_column]):
+            index = total_rows + position
+            selected = (index >= start_line or index in retry_lines) and index not in done_lines
+            if selected and not pd.isna(text) and not (max_rows and rows >= max_rows):
+                rows += 1
+                prompt_tokens += estimate_tokens(prompt_template.format(text))
+        total_rows += len(chunk)
+
+    system_prompt = BATCH_SYSTEM_PROMPT if batch_size > 1 else SYSTEM_PROMPT
+    request_count = -(-rows // batch_size)
+    return {
+        "total_rows": total_rows,
+        "rows": rows,
+        "requests": request_count,
+        "prompt_tokens": prompt_tokens + request_count * estimate_tokens(system_prompt),
+        "max_completion_tokens": rows * DEFAULT_MAX_TOKENS,
+    }
+
+def model_prices(settings, model):
+    """قیمت (ورودی، خروجی) هر ۱۰۰۰ توکن مدل از تنظیمات یا جدول پیش‌فرض"""
+    return settings.get("token_prices", {}).get(model) or DEFAULT_TOKEN_PRICES.get(model)
+
+def iter_input_rows(input_file, start_line, retry_lines, done_lines=(), chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    ردیف‌های از start_line به بعد و ردیف‌های ناموفق قبلی، به ترتیب فایل و مرحله به مرحله.
+    ردیف‌های done_lines (پس از خط ادامه ولی قبلاً در خروجی نوشته‌شده) کنار گذاشته می‌شوند.
+    """
+    offset = 0
+    for chunk in pd.read_csv(input_file, chunksize=chunk_size):
+        for position, record in enumerate(chunk.to_dict("records")):
+            index = offset + position
+            if (index >= start_line or index in retry_lines) and index not in done_lines:
+                yield index, record
+        offset += len(chunk)
+
+# نوشتن تدریجی خروجی
+def prepare_output_columns(output_file, input_columns, output_column):
+    """تعیین ستون‌های فایل خروجی؛ اگر فایل موجود ستون خروجی را نداشته باشد یک بار با افزودن آن بازنویسی می‌شود"""
+    if not os.path.exists(output_file):
+        return list(input_columns) + ([output_column] if output_column not in input_columns else [])
+
+    columns = list(pd.read_csv(output_file, nrows=0).columns)
+    if output_column not in columns:
+        df_output = pd.read_csv(output_file)
+        df_output[output_column] = ""
+        df_output.to_csv(output_file, index=False)
+        columns.append(output_column)
+    return columns
+
+def flush_rows(output_file, columns, rows, settings, settings_file, start_line, failed_lines, done_lines):
+    """
+    افزودن دسته ردیف‌های پردازش‌شده به فایل خروجی و ذخیره خط ادامه، ردیف‌های ناموفق
+    و ردیف‌های نوشته‌شده پس از خط ادامه همزمان با آن (مانند done_after در progress_journal.py).
+    """
+    if rows:
+        write_header = not os.path.exists(output_file)
+        pd.DataFrame(rows, columns=columns).to_csv(output_file, mode="a", header=write_header, index=False)
+        rows.clear()
+    # پاسخ‌ها خارج از ترتیب می‌رسند؛ ردیف‌های نوشته‌شده بالاتر از خط ادامه نباید در اجرای بعد دوباره نوشته شوند
+    done_lines.difference_update([i for i in done_lines if i < start_line])
+    settings["last_processed_line"] = start_line
+    settings["failed_lines"] = sorted(failed_lines)
+    settings["done_lines"] = sorted(done_lines)
+    save_settings(settings, settings_file)
+
+# پردازش فایل CSV
+def run_enrichment(settings, api_key, settings_file=SETTINGS_FILE, progress=None):
+    """
+    پردازش ستون ورودی فایل CSV با مدل و افزودن پاسخ‌ها به فایل خروجی بر اساس تنظیمات.
+    ادامه از settings["last_processed_line"] و تلاش دوباره settings["failed_lines"]؛ هر دو همراه هر دسته خروجی ذخیره می‌شوند.
+    progress در صورت وجود با دیکشنری وضعیت (processed، total، resume_line، cache، metrics) صدا زده می‌شود.
+    خلاصه اجرا به‌صورت دیکشنری برگردانده می‌شود.
+    """
+    input_file = settings["input_file"]
+    output_file = settings["output_file"]
+    input_column = settings["input_column"]
+    output_column = settings["output_column"]
+    prompt_template = settings["prompt_template"]
+    model = settings.get("model") or DEFAULT_SETTINGS["model"]
+    max_rows = int(settings.get("max_rows") or 0)
+    start_line = int(settings.get("last_processed_line") or 0)
+    chunk_size = int(settings.get("chunk_size", DEFAULT_CHUNK_SIZE))
+
+    input_columns = read_input_columns(input_file)
+    if input_column not in input_columns:
+        raise ValueError(f"ستون '{input_column}' در فایل پیدا نشد.")
+
+    # ردیف‌ها به‌جای pd.concat در هر مرحله، دسته‌ای به انتهای فایل خروجی اضافه می‌شوند
+    columns = prepare_output_columns(output_file, input_columns, output_column)
+    pending_rows = []
+    records = {}  # فقط ردیف‌هایی که هنوز پاسخشان نوشته نشده در حافظه می‌مانند
+
+    # ردیف‌هایی که در اجرای قبلی پس از همه تلاش‌ها ناموفق ماندند در خروجی نیستند و دوباره ارسال می‌شوند
+    failed_lines = set(settings.get("failed_lines", []))
+    retry_lines = {i for i in failed_lines if i < start_line}
+    done_lines = {i for i in settings.get("done_lines", []) if i >= start_line}
+
+    # چند ردیف در یک درخواست بسته‌بندی می‌شوند تا سربار پرامپت سیستم و رفت‌وبرگشت تقسیم شود
+    batch_size = max(1, int(settings.get("batch_size", DEFAULT_BATCH_SIZE)))
+    token_budget = int(settings.get("batch_token_budget", DEFAULT_BATCH_TOKEN_BUDGET))
+    batch = []
+    batch_tokens = 0
+
+    plan = plan_run(input_file, input_column, prompt_template, start_line, retry_lines, done_lines, max_rows, batch_size,
+                    chunk_size)
+    total_rows = plan["total_rows"]
+    metrics = EnrichmentMetrics(settings.get("metrics_file", DEFAULT_METRICS_FILE), prices=model_prices(settings, model))
+    metrics.set_plan(plan)
+
+    max_in_flight = int(settings.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT))
+    client = create_client(api_key, settings, max_in_flight, observe=metrics.observe_request)
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    in_flight = {}  # future ← فهرست (شماره ردیف، کلید کش، پرامپت)
+    cache = open_cache(settings)
+
+    processed_count = 0  # شمارنده پردازش‌ها
+    submitted_count = 0
+    next_line = start_line
+
+    def resume_line():
+        # پاسخ‌ها خارج از ترتیب می‌رسند؛ خط ادامه کوچک‌ترین ردیفی است که هنوز پاسخش نیامده
+        waiting = [index for batch_items in in_flight.values() for index, _, _ in batch_items]
+        waiting.extend(index for index, _, _ in batch)
+        return min((i for i in waiting if i >= start_line), default=next_line)
+
+    def accept(index, response, cached=False):
+        nonlocal processed_count
+        metrics.observe_row(cached)
+        failed_lines.discard(index)
+        done_lines.add(index)
+        row = records.pop(index)
+        row[output_column] = response
+        pending_rows.append(row)
+        processed_count += 1  # افزایش شمارنده
+
+    def maybe_flush():
+        # ذخیره دسته‌ای پاسخ‌ها تا در صورت قطع برنامه پاسخ‌های پرداخت‌شده از دست نروند؛
+        # فقط پس از ثبت همه ردیف‌های یک درخواست صدا زده می‌شود تا خط ادامه از ردیف ثبت‌نشده‌ای نگذرد
+        if len(pending_rows) >= WRITE_BATCH_SIZE:
+            flush_rows(output_file, columns, pending_rows, settings, settings_file, resume_line(), failed_lines, done_lines)
+
+    def report():
+        if progress:
+            progress({
+                "processed": processed_count,
+                "total": total_rows,
+                "resume_line": resume_line(),
+                "cache": cache.stats_text(),
+                "metrics": metrics.snapshot(),
+            })
+
+    def collect(block):
+        done, _ = wait(in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            batch_items = in_flight.pop(future)
+            try:
+                results, errors = future.result()
+            except Exception as e:  # خطای پیش‌بینی‌نشده همه ردیف‌های آن درخواست را ناموفق می‌کند، نه کل اجرا را
+                results, errors = {}, {index: f"{type(e).__name__}: {e}" for index, _, _ in batch_items}
+            for index, key, _ in batch_items:
+                if index not in results:
+                    records.pop(index)
+                    failed_lines.add(index)  # در خروجی نوشته نمی‌شود و در اجرای بعد دوباره تلاش می‌شود
+                    print(f"Row {index} failed: {errors.get(index)}")
+                    continue
+                cache.put(key, results[index])
+                accept(index, results[index])
+            maybe_flush()
+        report()
+
+    def submit():
+        # صف محدود تا ردیف‌های زیادی جلوتر از پاسخ‌ها ارسال نشوند
+        while len(in_flight) >= max_in_flight * 2:
+            collect(block=True)
+        items = [(index, prompt) for index, _, prompt in batch]
+        in_flight[executor.submit(complete_rows, client, items, model)] = list(batch)
+        batch.clear()
+        if len(in_flight) % max_in_flight == 0:
+            collect(block=False)
+
+    metrics.start(remaining_rows=lambda: max(0, plan["rows"] - processed_count))
+    try:
+        for index, record in iter_input_rows(input_file, start_line, retry_lines, done_lines, chunk_size):
+            if max_rows and submitted_count >= max_rows:
+                break  # توقف پردازش پس از رسیدن به حداکثر
+            if index >= start_line:
+                next_line = index + 1
+
+            text = record[input_column]
+            if pd.isna(text):
+                continue
+
+            prompt = prompt_template.format(text)
+            submitted_count += 1
+            records[index] = record
+
+            # پرامپت تکراری از کش پاسخ می‌گیرد و اصلاً به API نمی‌رسد. کلید پارامترهای تک‌ردیفی پرامپت است
+            # (نه پرامپت سیستم دسته‌ای) تا پاسخ حالت دسته‌ای، جایگزین تک‌ردیفی و اجراهای با batch_size دیگر مشترک باشد
+            key = cache_key(model, SYSTEM_PROMPT, prompt, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS)
+            response = cache.get(key)
+            if response is not None:
+                accept(index, response, cached=True)
+                maybe_flush()
+                if processed_count % WRITE_BATCH_SIZE == 0:
+                    report()
+                continue
+
+            prompt_tokens = estimate_tokens(prompt)
+            if batch and (len(batch) >= batch_size or batch_tokens + prompt_tokens > token_budget):
+                submit()
+                batch_tokens = 0
+            batch.append((index, key, prompt))
+            batch_tokens += prompt_tokens
+
+        if batch:
+            submit()
+        while in_flight:
+            collect(block=True)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        client.close()
+        flush_rows(output_file, columns, pending_rows, settings, settings_file, resume_line(), failed_lines, done_lines)
+        report()
+        cache.close()
+        metrics.close()
+
+    return {
+        "processed": processed_count,
+        "failed": len(failed_lines),
+        "resume_line": settings["last_processed_line"],
+        "output_file": output_file,
+    }
+
+
+def console_progress(interval=10.0):
+    """گزارش پیشرفت در خط فرمان حداکثر هر interval ثانیه یک بار"""
+    last_report = 0.0
+
+    def report(status):
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report >= interval:
+            last_report = now
+            print(f"{status['processed']} rows processed, resume line {status['resume_line']}/{status['total']}; "
+                  f"{status['cache']}\n{format_enrichment_metrics(status['metrics'])}", flush=True)
+    return report
+
+
+def print_estimate(settings):
+    """چاپ تخمین پیش از اجرا برای اندازه‌گیری دسته نسبت به موجودی"""
+    model = settings.get("model") or DEFAULT_SETTINGS["model"]
+    start_line = int(settings.get("last_processed_line") or 0)
+    retry_lines = {i for i in settings.get("failed_lines", []) if i < start_line}
+    done_lines = {i for i in settings.get("done_lines", []) if i >= start_line}
+    batch_size = max(1, int(settings.get("batch_size", DEFAULT_BATCH_SIZE)))
+    plan = plan_run(settings["input_file"], settings["input_column"], settings["prompt_template"], start_line,
+                    retry_lines, done_lines, int(settings.get("max_rows") or 0), batch_size,
+                    int(settings.get("chunk_size", DEFAULT_CHUNK_SIZE)))
+    cost = token_cost(model_prices(settings, model), plan["prompt_tokens"], plan["max_completion_tokens"])
+    print(f"{plan['rows']} of {plan['total_rows']} rows in {plan['requests']} requests, "
+          f"~{plan['prompt_tokens']} prompt tokens, <= {plan['max_completion_tokens']} completion tokens"
+          + (f", <= ${cost:.2f} with {model}" if cost is not None else f", no price configured for {model}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrich a CSV column with AvalAI chat completions (resumable).")
+    parser.add_argument("--settings", default=SETTINGS_FILE, help="settings JSON file; also stores the resume line")
+    parser.add_argument("--api-key-file", default=API_KEY_FILE)
+    parser.add_argument("--input", dest="input_file")
+    parser.add_argument("--output", dest="output_file")
+    parser.add_argument("--input-column")
+    parser.add_argument("--output-column")
+    parser.add_argument("--prompt", dest="prompt_template", help="prompt template with {} for the input text")
+    parser.add_argument("--model")
+    parser.add_argument("--max-rows", type=int)
+    parser.add_argument("--start-line", dest="last_processed_line", type=int)
+    parser.add_argument("--base-url")
+    parser.add_argument("--max-in-flight", type=int)
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--estimate", action="store_true", help="print the pre-flight token and cost estimate and exit")
+    args = parser.parse_args()
+
+    settings = load_settings(args.settings)
+    for name, value in vars(args).items():
+        if name not in ("settings", "api_key_file", "estimate") and value is not None:
+            settings[name] = value
+    save_settings(settings, args.settings)
+
+    missing = [name for name in ("input_file", "output_file", "input_column", "output_column", "prompt_template")
+               if not settings.get(name)]
+    if missing:
+        parser.error(f"missing settings: {', '.join(missing)}")
+
+    if args.estimate:
+        print_estimate(settings)
+        return
+
+    summary = run_enrichment(settings, load_api_key(args.api_key_file), args.settings, progress=console_progress())
+    print(f"Done: {summary['processed']} rows written to {summary['output_file']}, "
+          f"{summary['failed']} failed rows kept for retry, resume line {summary['resume_line']}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import time
+from collections import deque
+
+from scraper_metrics import Histogram, MetricsExporter
+
+# مرزهای سطل‌های تاخیر درخواست مدل (ثانیه)؛ پاسخ‌های دسته‌ای می‌توانند ده‌ها ثانیه طول بکشند
+LLM_LATENCY_BUCKETS = (0.5, 1, 2, 3, 5, 10, 20, 30, 60, float("inf"))
+
+# قیمت پیش‌فرض هر ۱۰۰۰ توکن (ورودی، خروجی) به دلار؛ با کلید token_prices در settings.json با تعرفه واقعی جایگزین می‌شود
+DEFAULT_TOKEN_PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4": (0.03, 0.06),
+}
+
+
+def token_cost(prices, prompt_tokens, completion_tokens):
+    """هزینه بر اساس قیمت (ورودی، خروجی) هر ۱۰۰۰ توکن؛ None اگر قیمت مدل مشخص نباشد"""
+    if not prices:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1000
+
+
+class EnrichmentMetrics(MetricsExporter):
+    """
+    حسابداری توکن و هزینه مسیر غنی‌سازی: تخمین پیش از اجرا، توکن‌های گزارش‌شده در usage هر پاسخ،
+    نرخ ردیف و توکن در دقیقه اخیر، تاخیر p50/p95 و پیش‌بینی زمان پایان و هزینه کل.
+    """
+
+    thread_name = "enrichment-metrics"
+
+    def __init__(self, metrics_file, prices=None, export_interval=15.0):
+        super().__init__(metrics_file, export_interval)
+        self.prices = prices
+        self.plan = None
+        self.latency = Histogram(LLM_LATENCY_BUCKETS)
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.rows = 0
+        self.cached_rows = 0
+        self.recent_rows = deque()  # زمان اتمام ردیف‌ها در یک دقیقه اخیر
+        self.recent_tokens = deque()  # (زمان، توکن) پاسخ‌ها در یک دقیقه اخیر
+        self.remaining_rows = lambda: None
+
+    def set_plan(self, plan):
+        """ثبت تخمین پیش از اجرا (خروجی plan_run) همراه با هزینه تخمینی"""
+        with self.lock:
+            self.plan = dict(plan, estimated_cost=token_cost(
+                self.prices, plan["prompt_tokens"], plan["max_completion_tokens"]))
+
+    def observe_request(self, seconds, usage):
+        """ثبت تاخیر و فیلدهای usage یک پاسخ موفق chat completions"""
+        now = time.time()
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        with self.lock:
+            self.latency.observe(seconds)
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.recent_tokens.append((now, prompt_tokens + completion_tokens))
+
+    def observe_row(self, cached=False):
+        with self.lock:
+            self.rows += 1
+            if cached:
+                self.cached_rows += 1
+            self.recent_rows.append(time.time())
+
+    def snapshot(self):
+        now = time.time()
+        remaining = self.remaining_rows()
+        with self.lock:
+            while self.recent_rows and now - self.recent_rows[0] > 60:
+                self.recent_rows.popleft()
+            while self.recent_tokens and now - self.recent_tokens[0][0] > 60:
+                self.recent_tokens.popleft()
+
+            rows_per_minute = len(self.recent_rows)
+            cost = token_cost(self.prices, self.prompt_tokens, self.completion_tokens)
+            eta_seconds = remaining / rows_per_minute * 60 if remaining is not None and rows_per_minute else None
+            projected_cost = None
+            if cost is not None and remaining is not None and self.rows:
+                projected_cost = cost + cost / self.rows * remaining
+
+            return {
+                "time": round(now, 3),
+                "uptime_seconds": round(now - self.started_at, 1),
+                "plan": self.plan,
+                "rows": self.rows,
+                "cached_rows": self.cached_rows,
+                "remaining_rows": remaining,
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "rows_per_minute": rows_per_minute,
+                "tokens_per_minute": sum(tokens for _, tokens in self.recent_tokens),
+                "latency": self.latency.snapshot(),
+                "cost": round(cost, 4) if cost is not None else None,
+                "projected_cost": round(projected_cost, 4) if projected_cost is not None else None,
+                "eta_seconds": round(eta_seconds) if eta_seconds is not None else None,
+                "projected_finish": round(now + eta_seconds) if eta_seconds is not None else None,
+            }
+
+    def start(self, remaining_rows=None):
+        if remaining_rows is not None:
+            self.remaining_rows = remaining_rows
+        super().start()
+
+
+def format_enrichment_metrics(metrics):
+    """خلاصه چندخطی متریک‌ها برای نمایش در رابط و خط فرمان"""
+    lines = []
+    plan = metrics.get("plan")
+    if plan:
+        estimated_cost = plan["estimated_cost"]
+        lines.append(
+            f"Plan: {plan['rows']} rows, ~{plan['prompt_tokens']} prompt tokens, "
+            f"<= {plan['max_completion_tokens']} completion tokens"
+            + (f", <= ${estimated_cost:.2f}" if estimated_cost is not None else "")
+        )
+    latency = metrics["latency"]
+    lines.append(
+        f"Rows/min: {metrics['rows_per_minute']}   Tokens/min: {metrics['tokens_per_minute']}   "
+        f"Latency p50/p95: {latency['p50']}s / {latency['p95']}s"
+    )
+    lines.append(
+        f"Requests: {metrics['requests']}   Tokens: {metrics['prompt_tokens']} in / {metrics['completion_tokens']} out"
+        + (f"   Cost: ${metrics['cost']:.4f}" if metrics["cost"] is not None else "")
+    )
+    if metrics["eta_seconds"] is not None:
+        finish = time.strftime("%H:%M", time.localtime(metrics["projected_finish"]))
+        projected = f", projected cost ${metrics['projected_cost']:.2f}" if metrics["projected_cost"] is not None else ""
+        lines.append(f"Remaining: {metrics['remaining_rows']} rows, ETA {metrics['eta_seconds'] // 60} min "
+                     f"(~{finish}){projected}")
+    return "\n".join(lines)
@@ -0,0 +1,141 @@
+import os
+import mmap
+import sqlite3
+import threading
+
+SHARD_PATTERN = "shard-{:05d}.bin"
+
+
+class ArchiveStore:
+    """
+    ذخیره تصاویر در فایل‌های شارد فقط-افزودنی با اندازه محدود به‌جای یک فایل برای هر حساب.
+    بایت‌های هر تصویر پشت سر هم در شارد جاری نوشته می‌شوند و ایندکس SQLite شناسه را به (شارد، آفست، طول) نگاشت می‌کند.
+    داده شارد پیش از ثبت ایندکس flush می‌شود تا ایندکس هرگز به بایت‌های نانوشته اشاره نکند.
+    """
+
+    def __init__(self, output_folder, shard_size=1024 ** 3, commit_every=100):
+        self.output_folder = output_folder
+        self.shard_size = shard_size
+        self.commit_every = commit_every
+        os.makedirs(output_folder, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(output_folder, "archive_index.sqlite"), check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS images (id TEXT PRIMARY KEY, shard INTEGER, offset INTEGER, length INTEGER)"
+        )
+        self.connection.commit()
+        self.present = {row[0] for row in self.connection.execute("SELECT id FROM images")}
+        self.uncommitted = 0
+        self.bytes_written = 0
+
+        (last_shard,) = self.connection.execute("SELECT COALESCE(MAX(shard), 0) FROM images").fetchone()
+        self._open_shard(last_shard)
+
+    def _open_shard(self, number):
+        self.shard_number = number
+        self.shard = open(os.path.join(self.output_folder, SHARD_PATTERN.format(number)), 'ab')
+        self.shard_offset = self.shard.tell()
+
+    def exists(self, file_name):
+        return file_name in self.present
+
+    def save(self, file_name, chunks):
+        """نوشتن کامل تصویر در شارد جاری و برگرداندن اندازه آن"""
+        data = b"".join(chunks)  # تصویر پروفایل کوچک است؛ کل آن در حافظه جمع و یک‌جا نوشته می‌شود
+        with self.lock:
+            if self.shard_offset and self.shard_offset + len(data) > self.shard_size:
+                self.shard.close()
+                self._open_shard(self.shard_number + 1)
+            offset = self.shard_offset
+            self.shard.write(data)
+            self.shard_offset += len(data)
+            self.bytes_written += len(data)
+
+            self.connection.execute(
+                "INSERT OR REPLACE INTO images (id, shard, offset, length) VALUES (?, ?, ?, ?)",
+                (file_name, self.shard_number, offset, len(data)),
+            )
+            self.present.add(file_name)
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_every:
+                self._commit_locked()
+        return len(data)
+
+    def commit(self):
+        """نوشتن قطعی شارد و ثبت ایندکس تا تصاویر ذخیره‌شده تاکنون پس از قطع برنامه باقی بمانند"""
+        with self.lock:
+            self._commit_locked()
+
+    def _commit_locked(self):
+        self.shard.flush()
+        os.fsync(self.shard.fileno())
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def report(self):
+        return (f"Archive: {len(self.present)} images in {self.shard_number + 1} shards, "
+                f"{self.bytes_written / 1024 / 1024:.1f} MiB written this run")
+
+    def close(self):
+        with self.lock:
+            self._commit_locked()
+            self.shard.close()
+            self.connection.close()
+
+
+class ArchiveReader:
+    """
+    خواندن تصادفی تصاویر از شاردها با mmap؛ get یک memoryview روی همان نگاشت برمی‌گرداند و داده‌ای کپی نمی‌شود.
+    شاردی که پس از نگاشت بزرگ‌تر شده (نوشتن همزمان ArchiveStore) دوباره نگاشت می‌شود.
+    """
+
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+        self.connection = sqlite3.connect(os.path.join(output_folder, "archive_index.sqlite"))
+        self.maps = {}
+        self.stale_maps = []  # نگاشت‌های قدیمی که memoryview آن‌ها هنوز آزاد نشده است
+
+    def _map(self, shard, end):
+        """نگاشت شارد که دست‌کم end بایت را پوشش دهد"""
+        archive_map = self.maps.get(shard)
+        if archive_map is not None and len(archive_map) >= end:
+            return archive_map
+        with open(os.path.join(self.output_folder, SHARD_PATTERN.format(shard)), 'rb') as f:
+            fresh = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(fresh) < end:
+            fresh.close()
+            raise ValueError(f"shard {shard} is shorter than its index entry ({end} bytes)")
+        if archive_map is not None:
+            try:
+                archive_map.close()
+            except BufferError:
+                self.stale_maps.append(archive_map)
+        self.maps[shard] = fresh
+        return fresh
+
+    def locate(self, file_name):
+        """(شارد، آفست، طول) یا None"""
+        return self.connection.execute(
+            "SELECT shard, offset, length FROM images WHERE id = ?", (file_name,)
+        ).fetchone()
+
+    def get(self, file_name):
+        """memoryview بدون کپی روی شارد؛ پیش از close باید آزاد (release) شود"""
+        location = self.locate(file_name)
+        if location is None:
+            raise KeyError(file_name)
+        shard, offset, length = location
+        return memoryview(self._map(shard, offset + length))[offset:offset + length]
+
+    def __contains__(self, file_name):
+        return self.locate(file_name) is not None
+
+    def ids(self):
+        for (file_name,) in self.connection.execute("SELECT id FROM images ORDER BY shard, offset"):
+            yield file_name
+
+    def close(self):
+        for archive_map in [*self.maps.values(), *self.stale_maps]:
+            archive_map.close()
+        self.connection.close()
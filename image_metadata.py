@@ -0,0 +1,53 @@
+import time
+import sqlite3
+import threading
+
+
+class ImageMetadata:
+    """
+    فایل جانبی SQLite برای متادیتای هر تصویر دانلودشده: آدرس، ETag، Last-Modified، اندازه و زمان دریافت.
+    در حالت به‌روزرسانی از این اطلاعات برای درخواست شرطی (If-None-Match / If-Modified-Since) استفاده می‌شود.
+    """
+
+    def __init__(self, db_file):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "id TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT, size INTEGER, fetched_at REAL)"
+        )
+        self.connection.commit()
+
+    def conditional_headers(self, file_name):
+        """هدرهای درخواست شرطی برای تصویری که قبلاً دریافت شده است"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT etag, last_modified FROM images WHERE id = ?", (file_name,)
+            ).fetchone()
+        headers = {}
+        if row:
+            if row[0]:
+                headers["If-None-Match"] = row[0]
+            if row[1]:
+                headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def record(self, file_name, url, response, size):
+        """ثبت متادیتای پاسخ 200"""
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO images (id, url, etag, last_modified, size, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (file_name, url, response.headers.get("ETag"), response.headers.get("Last-Modified"), size, time.time()),
+            )
+            self.connection.commit()
+
+    def touch(self, file_name, url):
+        """به‌روزرسانی زمان بررسی برای پاسخ 304 بدون تغییر محتوا"""
+        with self.lock:
+            self.connection.execute("UPDATE images SET url = ?, fetched_at = ? WHERE id = ?", (url, time.time(), file_name))
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
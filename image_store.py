@@ -0,0 +1,127 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+
+class FileStore:
+    """
+    ذخیره هر تصویر در فایل جداگانه {نام}.jpg؛ نوشتن در فایل موقت و جابه‌جایی اتمی تا فایل نیمه‌کاره باقی نماند.
+    پوشه خروجی فقط یک بار هنگام شروع اسکن می‌شود و بررسی وجود فایل از همان مجموعه در حافظه انجام می‌شود.
+    """
+
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+        self.temp_folder = os.path.join(output_folder, '.tmp')
+        os.makedirs(self.temp_folder, exist_ok=True)
+        with os.scandir(output_folder) as entries:
+            self.present = {entry.name[:-4] for entry in entries if entry.name.endswith('.jpg')}
+
+    def path(self, file_name):
+        return os.path.join(self.output_folder, f"{file_name}.jpg")
+
+    def exists(self, file_name):
+        return file_name in self.present
+
+    def _write_temp(self, chunks, digest=None):
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_folder)
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path, size
+
+    def save(self, file_name, chunks):
+        """ذخیره تصویر و برگرداندن اندازه آن به بایت"""
+        temp_path, size = self._write_temp(chunks)
+        os.replace(temp_path, self.path(file_name))
+        self.present.add(file_name)
+        return size
+
+    def report(self):
+        return None
+
+    def commit(self):
+        pass  # هر تصویر با جابه‌جایی اتمی فایل همان لحظه ماندگار است
+
+    def close(self):
+        pass
+
+
+class ContentStore(FileStore):
+    """
+    ذخیره‌سازی بر اساس محتوا: بایت‌های هر تصویر هنگام دریافت هش (SHA-256) می‌شوند و هر محتوای یکتا فقط یک بار
+    در objects/xx/<hash>.jpg ذخیره می‌شود. نام {instagramID}.jpg یک hard link به همان شیء است
+    و نگاشت شناسه به هش در index.jsonl ثبت می‌شود (اگر hard link ممکن نباشد فقط همین نگاشت می‌ماند).
+    """
+
+    def __init__(self, output_folder):
+        super().__init__(output_folder)
+        self.objects_folder = os.path.join(output_folder, 'objects')
+        self.index_file = os.path.join(output_folder, 'index.jsonl')
+        os.makedirs(self.objects_folder, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.ids = {}  # شناسه ← هش (بخش هگز)
+        self.bytes_saved = 0
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.ids[entry["id"]] = entry["sha256"]
+        self.index = open(self.index_file, 'a', encoding='utf-8')
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_folder, sha256[:2], f"{sha256}.jpg")
+
+    def exists(self, file_name):
+        with self.lock:
+            return file_name in self.ids or super().exists(file_name)
+
+    def save(self, file_name, chunks):
+        digest = hashlib.sha256()
+        temp_path, size = self._write_temp(chunks, digest)
+        sha256 = digest.hexdigest()
+        object_path = self.object_path(sha256)
+
+        with self.lock:
+            if os.path.exists(object_path):
+                os.remove(temp_path)  # محتوای تکراری؛ فقط نام جدید به شیء موجود اشاره می‌کند
+                self.bytes_saved += size
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(temp_path, object_path)
+
+            link_path = self.path(file_name)
+            try:
+                if os.path.exists(link_path):
+                    os.remove(link_path)
+                os.link(object_path, link_path)
+            except OSError:
+                pass  # فایل‌سیستم بدون پشتیبانی hard link؛ نگاشت index.jsonl کافی است
+            self.present.add(file_name)
+
+            self.ids[file_name] = sha256
+            self.index.write(json.dumps({"id": file_name, "sha256": sha256, "size": size}) + "\n")
+            self.index.flush()
+        return size
+
+    def report(self):
+        """گزارش نسبت تصاویر تکراری"""
+        with self.lock:
+            total = len(self.ids)
+            unique = len(set(self.ids.values()))
+        ratio = (1 - unique / total) * 100 if total else 0
+        return (f"Content store: {total} images, {unique} unique, duplicate ratio {ratio:.1f}%, "
+                f"{self.bytes_saved / 1024 / 1024:.1f} MiB saved this run")
+
+    def close(self):
+        self.index.close()
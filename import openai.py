@@ -1,150 +1,21 @@
-import requests
-import pandas as pd
+import queue
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import json
-import os
 
-# فایل‌های تنظیمات
-SETTINGS_FILE = "settings.json"
-API_KEY_FILE = "api_key.txt"
+from enrichment import (load_settings, save_settings, load_api_key, save_api_key, get_user_credit,
+                        run_enrichment, DEFAULT_BASE_URL)
+from enrichment_metrics import format_enrichment_metrics
 
-# آدرس‌های API AvalAI
-BASE_URL_CREDIT = "https://api.avalai.ir/user/credit"
-BASE_URL_CHAT = "https://api.avalai.ir/v1/chat/completions"
+# رابط گرافیکی سبک روی موتور enrichment.py؛ پردازش در یک نخ پس‌زمینه اجرا می‌شود
+# و پیشرفت از طریق صف به نخ اصلی Tk می‌رسد تا پنجره هنگام پردازش قفل نشود.
 
-# مدیریت تنظیمات
-def save_settings(settings):
-    """ذخیره تنظیمات در فایل JSON"""
-    with open(SETTINGS_FILE, "w") as file:
-        json.dump(settings, file)
+# فاصله بررسی صف پیشرفت (میلی‌ثانیه)
+POLL_INTERVAL_MS = 200
 
-def load_settings():
-    """بارگذاری تنظیمات از فایل JSON"""
-    try:
-        with open(SETTINGS_FILE, "r") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {
-            "input_file": "",
-            "output_file": "",
-            "input_column": "",
-            "output_column": "",
-            "prompt_template": "",
-            "model": "gpt-3.5-turbo",
-            "max_rows": 0,
-            "last_processed_line": 0,
-        }
-
-# مدیریت کلید API
-def save_api_key(api_key):
-    """ذخیره API Key در فایل"""
-    with open(API_KEY_FILE, "w") as file:
-        file.write(api_key)
-
-def load_api_key():
-    """خواندن API Key از فایل"""
-    try:
-        with open(API_KEY_FILE, "r") as file:
-            return file.read().strip()
-    except FileNotFoundError:
-        return ""
-
-# بارگذاری API Key
-API_KEY = load_api_key()
-
-# دریافت موجودی
-def get_user_credit():
-    """دریافت موجودی از API"""
-    if not API_KEY:
-        return "API Key وارد نشده است."
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {API_KEY}"}
-    try:
-        response = requests.get(BASE_URL_CREDIT, headers=headers)
-        if response.status_code == 200:
-            return response.json().get("credit", "نامشخص")
-        else:
-            return f"خطا: {response.status_code}"
-    except Exception as e:
-        return f"خطا در ارتباط با API: {e}"
-
-# ارسال درخواست به API AvalAI
-def generate_response(prompt, model="gpt-3.5-turbo"):
-    """ارسال پرامپت به AvalAI و دریافت پاسخ"""
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt},
-        ],
-        "temperature": 0.7,
-        "max_tokens": 100,
-    }
-    try:
-        response = requests.post(BASE_URL_CHAT, json=payload, headers=headers)
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
-        else:
-            raise RuntimeError(f"خطا: {response.status_code}, {response.text}")
-    except Exception as e:
-        return f"خطا در ارتباط با AvalAI: {e}"
-
-# پردازش فایل CSV
-def process_csv(input_file, output_file, input_column, output_column, prompt_template, max_rows, model, start_line):
-    try:
-        df = pd.read_csv(input_file)
-
-        if input_column not in df.columns:
-            messagebox.showerror("Error", f"ستون '{input_column}' در فایل پیدا نشد.")
-            return
-
-        if os.path.exists(output_file):
-            df_output = pd.read_csv(output_file)
-        else:
-            df_output = pd.DataFrame(columns=df.columns)
-
-        if output_column not in df_output.columns:
-            df_output[output_column] = ""
-
-        total_rows = len(df)
-        progress_bar["maximum"] = total_rows  # تنظیم نوار پیشرفت
-
-        processed_count = 0  # شمارنده پردازش‌ها
-
-        for index, row in df.iterrows():
-            if index < start_line:
-                continue
-            if max_rows and processed_count >= max_rows:
-                break  # توقف پردازش پس از رسیدن به حداکثر
-
-            text = row[input_column]
-            if pd.isna(text):
-                continue
-
-            prompt = prompt_template.format(text)
-            response = generate_response(prompt, model)
-            row[output_column] = response
-            df_output = pd.concat([df_output, pd.DataFrame([row])], ignore_index=True)
-
-            start_line = index + 1
-            processed_count += 1  # افزایش شمارنده
-            last_line_entry.delete(0, tk.END)
-            last_line_entry.insert(0, start_line)
-
-            # به‌روزرسانی Progress Bar
-            progress_bar["value"] = processed_count
-            root.update_idletasks()
-
-        df_output.to_csv(output_file, index=False)
-        settings["last_processed_line"] = start_line
-        save_settings(settings)
-        messagebox.showinfo("Success", f"فایل خروجی به‌روزرسانی شد: {output_file}")
-    except Exception as e:
-        messagebox.showerror("Error", f"خطا در پردازش: {e}")
+# پیام‌های نخ پردازش به رابط
+progress_queue = queue.Queue()
+worker = None
 
 # مدیریت فایل‌ها
 def open_file_dialog(entry_field):
@@ -159,11 +30,58 @@ def save_file_dialog(entry_field):
 
 # به‌روزرسانی موجودی
 def update_credit():
-    credit = get_user_credit()
+    credit = get_user_credit(api_key_entry.get().strip(), settings.get("base_url") or DEFAULT_BASE_URL)
     credit_label.config(text=f"موجودی: {credit}")
 
-# اجرای پردازش
+# اجرای پردازش در پس‌زمینه
+def processing_worker(job_settings, api_key):
+    def report(status):
+        progress_queue.put(("progress", status))
+
+    try:
+        summary = run_enrichment(job_settings, api_key, progress=report)
+        progress_queue.put(("done", summary))
+    except Exception as e:
+        progress_queue.put(("error", e))
+
+def poll_progress():
+    """اعمال پیام‌های نخ پردازش روی ویجت‌ها؛ فقط در نخ اصلی Tk اجرا می‌شود"""
+    try:
+        while True:
+            kind, payload = progress_queue.get_nowait()
+            if kind == "progress":
+                progress_bar["maximum"] = payload["total"]
+                progress_bar["value"] = payload["resume_line"]
+                last_line_entry.delete(0, tk.END)
+                last_line_entry.insert(0, payload["resume_line"])
+                cache_label.config(text=payload["cache"])
+                status_label.config(text=f"{payload['processed']} ردیف پردازش شد")
+                metrics_label.config(text=format_enrichment_metrics(payload["metrics"]))
+            else:
+                finish_processing(kind, payload)
+    except queue.Empty:
+        pass
+    if worker is not None:
+        root.after(POLL_INTERVAL_MS, poll_progress)
+
+def finish_processing(kind, payload):
+    global worker
+    worker = None
+    run_button.config(state=tk.NORMAL)
+    settings.update(load_settings())  # خط ادامه و ردیف‌های ناموفق را موتور در فایل تنظیمات ذخیره کرده است
+    if kind == "error":
+        messagebox.showerror("Error", f"خطا در پردازش: {payload}")
+        return
+    message = f"فایل خروجی به‌روزرسانی شد: {payload['output_file']}"
+    if payload["failed"]:
+        message += f"\n{payload['failed']} ردیف ناموفق برای تلاش دوباره در اجرای بعد نگه داشته شد."
+    messagebox.showinfo("Success", message)
+
 def run_processing():
+    global worker
+    if worker is not None:
+        return
+
     settings["input_file"] = input_file_entry.get()
     settings["output_file"] = output_file_entry.get()
     settings["input_column"] = input_column_entry.get()
@@ -179,16 +97,10 @@ def run_processing():
         messagebox.showerror("Error", "لطفاً همه فیلدها را پر کنید.")
         return
 
-    process_csv(
-        settings["input_file"],
-        settings["output_file"],
-        settings["input_column"],
-        settings["output_column"],
-        settings["prompt_template"],
-        settings["max_rows"],
-        settings["model"],
-        settings["last_processed_line"],
-    )
+    run_button.config(state=tk.DISABLED)
+    worker = threading.Thread(target=processing_worker, args=(dict(settings), api_key_entry.get().strip()), daemon=True)
+    worker.start()
+    root.after(POLL_INTERVAL_MS, poll_progress)
 
 # رابط کاربری
 root = tk.Tk()
@@ -205,7 +117,7 @@ settings = load_settings()
 tk.Label(frame, text="API Key:").grid(row=0, column=0, sticky="w")
 api_key_entry = tk.Entry(frame, width=30)
 api_key_entry.grid(row=0, column=1)
-api_key_entry.insert(0, API_KEY)
+api_key_entry.insert(0, load_api_key())
 tk.Button(frame, text="ذخیره", command=lambda: save_api_key(api_key_entry.get())).grid(row=0, column=2)
 
 # موجودی
@@ -260,11 +172,22 @@ last_line_entry = tk.Entry(frame, width=30)
 last_line_entry.grid(row=8, column=1)
 last_line_entry.insert(0, str(settings["last_processed_line"]))
 
+# آمار کش پاسخ‌ها و وضعیت پردازش
+cache_label = tk.Label(root, text="کش پاسخ: ...")
+cache_label.pack(pady=5)
+status_label = tk.Label(root, text="")
+status_label.pack(pady=5)
+
+# توکن، هزینه و تاخیر درخواست‌ها
+metrics_label = tk.Label(root, text="", justify="left")
+metrics_label.pack(pady=5)
+
 # Progress Bar
 progress_bar = ttk.Progressbar(root, orient="horizontal", length=400, mode="determinate")
 progress_bar.pack(pady=10)
 
 # دکمه اجرا
-tk.Button(root, text="شروع پردازش", command=run_processing, bg="green", fg="white").pack(pady=10)
+run_button = tk.Button(root, text="شروع پردازش", command=run_processing, bg="green", fg="white")
+run_button.pack(pady=10)
 
 root.mainloop()
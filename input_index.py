@@ -0,0 +1,124 @@
+import os
+import csv
+import sys
+import json
+import hashlib
+import logging
+
+# اندازه بلوک ابتدا و انتهای بخش ایندکس‌شده که برای تشخیص بازنویسی فایل ورودی هش می‌شود
+FINGERPRINT_BLOCK = 65536
+
+
+class InputIndex:
+    """
+    خواندن جریانی فایل ورودی CSV با کمک ایندکس آفست بایتی ذخیره‌شده.
+    آفست شروع هر stride سطر در فایل جانبی نگه‌داری می‌شود تا برای ادامه کار مستقیم به سطر مورد نظر seek شود
+    و کل فایل در حافظه بارگذاری نشود. اگر فایل ورودی فقط بزرگ‌تر شده باشد، ایندکس از آخرین آفست ادامه داده می‌شود؛
+    هش بلوک اول و آخر بخش ایندکس‌شده فایلی را که با محتوای دیگری بازنویسی شده تشخیص می‌دهد.
+    فرض بر این است که هیچ سطری شامل newline داخل کوتیشن نیست (ستون‌ها لینک، دسته‌بندی و شهر هستند).
+    """
+
+    def __init__(self, input_file, index_file=None, stride=1000):
+        self.input_file = input_file
+        self.index_file = index_file or f"{input_file}.idx"
+        self.stride = stride
+        self.offsets = []  # آفست بایتی سطرهای 0، stride، 2*stride و ...
+        self.row_count = 0
+        self.indexed_size = 0
+        self._load_or_build()
+
+    def _load_or_build(self):
+        size = os.path.getsize(self.input_file)
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as file:
+                saved = json.load(file)
+            # ایندکس فقط وقتی معتبر است که فایل کوچک‌تر نشده، بخش ایندکس‌شده تغییر نکرده و آفست‌ها هنوز روی ابتدای سطر باشند
+            if (saved.get("stride") == self.stride and saved.get("size", 0) <= size
+                    and saved.get("fingerprint") == self._fingerprint(saved["size"])
+                    and self._is_line_start(saved["offsets"])):
+                self.offsets = saved["offsets"]
+                self.row_count = saved["rows"]
+                self.indexed_size = saved["size"]
+        if self.indexed_size == size and self.offsets:
+            return
+        self._extend_index(size)
+
+    def _fingerprint(self, size):
+        """هش بلوک اول و آخر size بایت ابتدای فایل ورودی"""
+        digest = hashlib.sha1()
+        with open(self.input_file, 'rb') as file:
+            digest.update(file.read(min(size, FINGERPRINT_BLOCK)))
+            if size > FINGERPRINT_BLOCK:
+                file.seek(max(FINGERPRINT_BLOCK, size - FINGERPRINT_BLOCK))
+                digest.update(file.read(size - file.tell()))
+        return digest.hexdigest()
+
+    def _is_line_start(self, offsets):
+        if not offsets:
+            return False
+        with open(self.input_file, 'rb') as file:
+            file.seek(offsets[-1] - 1)
+            return file.read(1) == b"\n"
+
+    def _extend_index(self, size):
+        """اسکن فقط بخش ایندکس‌نشده فایل و ذخیره ایندکس جدید"""
+        with open(self.input_file, 'rb') as file:
+            if self.indexed_size:
+                file.seek(self.indexed_size)
+            else:
+                file.readline()  # رد کردن سطر هدر
+            position = file.tell()
+            for line in iter(file.readline, b""):
+                if not line.strip():
+                    position += len(line)
+                    continue
+                if self.row_count % self.stride == 0:
+                    self.offsets.append(position)
+                self.row_count += 1
+                position += len(line)
+        self.indexed_size = size
+        with open(self.index_file, 'w', encoding='utf-8') as file:
+            json.dump({"stride": self.stride, "size": size, "fingerprint": self._fingerprint(size), "rows": self.row_count,
+                       "offsets": self.offsets}, file)
+        logging.info(f"ایندکس فایل ورودی به‌روزرسانی شد ({self.row_count} سطر).")
+
+    def read_rows(self, start, count):
+        """برگرداندن (ایندکس، سطر) برای سطرهای start تا start + count بدون خواندن کل فایل"""
+        if start >= self.row_count:
+            return
+        block = start // self.stride
+        index = block * self.stride
+        with open(self.input_file, 'rb') as file:
+            file.seek(self.offsets[block])
+            for line in iter(file.readline, b""):
+                if not line.strip():
+                    continue
+                if index >= start + count:
+                    break
+                if index >= start:
+                    yield index, next(csv.reader([line.decode('utf-8')]))
+                index += 1
+
+    def __len__(self):
+        return self.row_count
+
+
+def parse_input_row(row):
+    """اعتبارسنجی تنبل یک سطر ورودی؛ برای سطر ناقص None برمی‌گرداند. دسته‌بندی و شهر intern می‌شوند."""
+    if len(row) < 3 or not row[0]:
+        return None
+    return row[0], sys.intern(row[1]), sys.intern(row[2])
+
+
+def mark_failed(input_file, failed_indices):
+    """ثبت ایندکس لینک‌های ناموفق در فایل جانبی به‌جای بازنویسی فایل ورودی"""
+    failed_file = f"{input_file}.failed"
+    existing = set()
+    if os.path.exists(failed_file):
+        with open(failed_file, 'r', encoding='utf-8') as file:
+            existing = {int(line) for line in file if line.strip()}
+    new_indices = [index for index in failed_indices if index not in existing]
+    if new_indices:
+        with open(failed_file, 'a', encoding='utf-8') as file:
+            file.writelines(f"{index}\n" for index in new_indices)
+    return new_indices
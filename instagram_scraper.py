@@ -1,12 +1,20 @@
 import instaloader
 import time
-import requests
-import csv
-import os
 import json
 import logging
 import sys
-from threading import Timer
+import queue
+import threading
+
+from rate_limiter import create_rate_limiters
+from result_writer import ResultWriter
+from progress_journal import ProgressJournal
+from session_pool import create_loader, abort_requests
+from profile_cache import ProfileCache
+from input_index import InputIndex, parse_input_row, mark_failed
+from scrape_plan import plan_batch
+from deadline_watchdog import DeadlineWatchdog
+from scraper_metrics import ScraperMetrics
 
 # تنظیم لاگ‌گیری
 logging.basicConfig(
@@ -18,24 +26,32 @@ logging.basicConfig(
 # انتقال پیام‌های خطای Instaloader به فایل لاگ
 sys.stderr = open("error.log", "a")
 
-def timeout_handler(session, tag, session_id, config_file):
-    """غیرفعال کردن سشن در صورت عدم دریافت داده در زمان مشخص"""
-    logging.error(f"سشن {tag} به دلیل تایم‌اوت غیرفعال شد.")
-    for session_data in config_file["sessions"]:
-        if session_data["session_id"] == session_id:
-            session_data["session_id"] = f"#{session_id}"
-            session_data["tag"] += " - Disabled"
-    update_config("config.json", config_file)
+# حداکثر تعداد تلاش برای یک لینک پس از خطای اتصال پیش از ثبت به‌عنوان ناموفق
+MAX_ATTEMPTS_PER_LINK = 3
 
-def get_instagram_data(username, session, category, city, config_file, tag, session_id):
+# ستون‌های ثابت فایل خروجی (به همان ترتیب داده‌های get_instagram_data)
+OUTPUT_FIELDNAMES = [
+    "instagramID", "Username", "query", "Full Name", "followersCount", "followingCount",
+    "PostCount", "bio", "website", "Is Private", "Is Verified", "imageUrl", "Category", "City",
+    "Business Phone Number", "Business Email", "Business Address", "Website Link",
+]
+
+class DeadlineExceeded(instaloader.exceptions.ConnectionException):
+    """درخواستی که ناظر مهلت قطع کرد؛ خنک‌سازی سشن فقط یک بار در مسیر خطای اتصال کارگر انجام می‌شود"""
+
+def timeout_handler(tag, loader, expired):
+    """قطع درخواست در جریان سشن در صورت عدم دریافت داده در زمان مشخص"""
+    logging.error(f"مهلت درخواست سشن {tag} تمام شد و درخواست قطع شد.")
+    expired.set()
+    abort_requests(loader)
+
+def get_instagram_data(username, loader, category, city, tag, watchdog, deadline=20.0):
     """دریافت داده‌های اینستاگرام برای یک لینک پروفایل با تایم‌اوت"""
-    L = instaloader.Instaloader()
-    timer = Timer(10.0, timeout_handler, [session, tag, session_id, config_file])  # تایم‌اوت 10 ثانیه
+    # هر عملیات سوکت با تایم‌اوت اتصال/خواندن سشن محدود است؛ ناظر مشترک مهلت کل درخواست را کنترل می‌کند
+    expired = threading.Event()
+    token = watchdog.watch(deadline, timeout_handler, tag, loader, expired)
     try:
-        timer.start()
-        L.context._session = session
-        profile = instaloader.Profile.from_username(L.context, username)
-        timer.cancel()
+        profile = instaloader.Profile.from_username(loader.context, username)
 
         # اطلاعات عمومی پروفایل
         business_phone_number = profile.business_phone_number if hasattr(profile, 'business_phone_number') else "ندارد"
@@ -67,18 +83,20 @@ def get_instagram_data(username, session, category, city, config_file, tag, sess
         logging.info(f"داده‌های پروفایل {username} با موفقیت دریافت شد.")
         return data
     except instaloader.exceptions.ProfileNotExistsException:
-        timer.cancel()
         logging.warning(f"پروفایل {username} یافت نشد.")
         return None
+    except instaloader.exceptions.ConnectionException as e:
+        # خطاهای اتصال، تایم‌اوت سوکت و 429 به فراخواننده می‌رسند تا نرخ سشن کاهش یابد
+        if expired.is_set():
+            raise DeadlineExceeded(f"deadline of {deadline}s exceeded: {e}") from e
+        raise
     except Exception as e:
-        timer.cancel()
         logging.error(f"خطا در دریافت اطلاعات برای {username}: {str(e)}")
         return None
     finally:
-        if timer.is_alive():
-            timer.cancel()
+        watchdog.cancel(token)
 
-def create_sessions(session_data, max_active_sessions=5):
+def create_sessions(session_data, max_active_sessions=5, timeout=(5, 10)):
     """ایجاد سشن‌های اینستاگرام با استفاده از session_id های مختلف و محدود کردن تعداد سشن‌های فعال"""
     sessions = []
     active_count = 0
@@ -90,99 +108,182 @@ def create_sessions(session_data, max_active_sessions=5):
         if session_id.startswith("#"):
             logging.info(f"سشن غیرفعال: {session['tag']}")
             continue
-        session_obj = requests.Session()
-        session_obj.cookies.set("sessionid", session_id, domain=".instagram.com")
-        sessions.append((session_obj, session["tag"], session_id))
+        # یک Instaloader ماندگار با استخر اتصال برای هر سشن؛ تلاش مجدد داخلی خاموش است تا 429 به محدودکننده نرخ برسد
+        loader = create_loader(session_id, max_connection_attempts=1, timeout=timeout)
+        sessions.append((loader, session["tag"], session_id))
         active_count += 1
     logging.info(f"تعداد سشن‌های فعال: {active_count}")
     return sessions
 
-def update_input_file(input_file, failed_indices):
-    """به‌روزرسانی فایل ورودی و اضافه کردن ستاره به ستون D برای لینک‌های ناموفق"""
-    with open(input_file, 'r', encoding='utf-8') as file:
-        rows = list(csv.reader(file))
-
-    for index in failed_indices:
-        if len(rows[index]) <= 3:
-            rows[index].extend(["*"])
-        else:
-            rows[index][3] = "*"
-
-    with open(input_file, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerows(rows)
-    logging.info(f"فایل ورودی به‌روزرسانی شد. تعداد لینک‌های ناموفق: {len(failed_indices)}")
-
-def validate_input_file(input_file):
-    """بررسی فایل ورودی و حذف یا نادیده گرفتن سطرهای ناقص"""
-    valid_rows = []
-    with open(input_file, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        header = next(reader, None)  # رد کردن سطر هدر
-        if header:
-            valid_rows.append(header)
-        for row in reader:
-            if len(row) < 3 or not row[0]:
-                logging.warning(f"سطر ناقص یافت شد و نادیده گرفته شد: {row}")
-                continue
-            valid_rows.append(row)
-
-    with open(input_file, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerows(valid_rows)
-    logging.info(f"فایل ورودی اعتبارسنجی و به‌روزرسانی شد.")
-
-def update_config(config_file, config_data):
-    """به‌روزرسانی فایل کانفیگ با وضعیت جدید"""
-    with open(config_file, 'w', encoding='utf-8') as file:
-        json.dump(config_data, file, ensure_ascii=False, indent=4)
-    logging.info("فایل کانفیگ به‌روزرسانی شد.")
-
-def process_usernames(links, sessions, output_file, start_index, count, categories_and_cities, delay, config_file):
-    if not sessions:
-        logging.error("هیچ سشن معتبری برای پردازش موجود نیست.")
-        return start_index  # بازگشت به ایندکس شروع در صورت نبود سشن معتبر
-
-    results = []
-    failed_indices = []
-    session_count = len(sessions)
-    end_index = min(start_index + count, len(links))
-
-    for i, link in enumerate(links[start_index:end_index], start=start_index):
-        session, tag, session_id = sessions[i % session_count]  # انتخاب سشن برای این لینک
-        logging.info(f"در حال پردازش {link} ({i + 1}/{end_index}) با سشن {i % session_count + 1} ({tag})...")
+def fan_out(writer, journal, data, targets, status, tag):
+    """نوشتن یک نتیجه برای همه سطرهای ورودی که به این نام کاربری اشاره داشتند"""
+    for i, category, city in targets:
+        # نتیجه پیش از ثبت در ژورنال در بافر قرار می‌گیرد تا ژورنال جلوتر از خروجی نباشد
+        if data:
+            writer.write({**data, "Category": category, "City": city})
+        journal.record(i, status, tag)
+
+def session_worker(worker_number, session_entry, limiter, work_queue, writer, journal, cache, watchdog, metrics, state):
+    """
+    کارگر یک سشن: برداشتن لینک از صف مشترک، دریافت داده و رعایت نرخ مخصوص همین سشن.
+    سشن در حال خنک‌سازی لینکی برنمی‌دارد تا سشن‌های دیگر صف را پیش ببرند و کارگر بیکار تا تمام شدن
+    همه لینک‌ها (از جمله لینک‌هایی که پس از خطا به صف برمی‌گردند) باقی می‌ماند.
+    """
+    loader, tag, session_id = session_entry
+    while True:
+        if limiter.is_cooling_down():
+            if work_queue.unfinished_tasks == 0:
+                return
+            time.sleep(1)
+            continue
+        try:
+            item = work_queue.get(timeout=1)
+        except queue.Empty:
+            if work_queue.unfinished_tasks == 0:
+                return
+            continue  # لینک‌های در حال پردازش سشن‌های دیگر ممکن است به صف برگردند
+
+        username, targets = item
+        i, category, city = targets[0]
+        logging.info(f"در حال پردازش {username} ({i + 1}/{state['end_index']}، {len(targets)} سطر) با سشن {worker_number} ({tag})...")
+
+        # در صورت وجود پروفایل در کش، درخواست شبکه‌ای ارسال نمی‌شود و فقط دسته‌بندی و شهر هر سطر اضافه می‌شود
+        cached = cache.get(username)
+        if cached is not None:
+            metrics.observe_cached(tag)
+            fan_out(writer, journal, cached, targets, "cached", tag)
+            work_queue.task_done()
+            continue
 
-        username = link.split('/')[-2]  # استخراج نام کاربری از لینک پروفایل
-        category, city = categories_and_cities[i]
+        if limiter.is_cooling_down():
+            # خنک‌سازی پس از برداشتن لینک شروع شده است؛ لینک برای سشن دیگری به صف برمی‌گردد
+            work_queue.put(item)
+            work_queue.task_done()
+            continue
+        limiter.acquire()  # انتظار برای توکن آزاد
 
+        data = None
+        status = "ok"
+        started = time.perf_counter()
         try:
-            data = get_instagram_data(username, session, category, city, config_file, tag, session_id)
+            data = get_instagram_data(username, loader, category, city, tag, watchdog, state["deadline"])
+            limiter.record_success()
             if data:
-                results.append(data)
+                metrics.observe_request(tag, time.perf_counter() - started, "success")
+                cache.put(username, data)
             else:
+                metrics.observe_request(tag, time.perf_counter() - started, "not_found")
+                status = "not_found"
                 logging.warning(f"داده‌ای برای {username} یافت نشد.")
+        except instaloader.exceptions.ConnectionException as e:
+            metrics.observe_request(tag, time.perf_counter() - started, "error")
+            # 429 و قطع درخواست توسط ناظر مهلت سشن را خنک می‌کنند
+            throttled = isinstance(e, (instaloader.exceptions.TooManyRequestsException, DeadlineExceeded)) or "429" in str(e)
+            limiter.record_failure(cool_down=throttled)
+            logging.error(f"خطای اتصال سشن {worker_number} ({tag}): {str(e)}")
+            with state["lock"]:
+                attempts = state["attempts"].get(username, 0) + 1
+                state["attempts"][username] = attempts
+            if attempts < MAX_ATTEMPTS_PER_LINK:
+                # بازگرداندن لینک به صف تا سشن دیگری آن را پردازش کند
+                work_queue.put(item)
+                work_queue.task_done()
+                continue
+            status = "failed"
         except Exception as e:
-            logging.error(f"خطای سشن {i % session_count + 1} ({tag}): {str(e)}")
-            failed_indices.append(i)
-            continue
+            metrics.observe_request(tag, time.perf_counter() - started, "error")
+            logging.error(f"خطای سشن {worker_number} ({tag}): {str(e)}")
+            status = "failed"
 
-        time.sleep(delay)  # تاخیر بین درخواست‌ها
+        fan_out(writer, journal, data, targets, status, tag)
+        work_queue.task_done()
 
-        # ذخیره نتایج در فایل CSV بعد از هر پروفایل
-        if results:
-            keys = results[0].keys()
-            with open(output_file, 'a', newline='', encoding='utf-8') as output:
-                writer = csv.DictWriter(output, fieldnames=keys)
-                if i == start_index:  # فقط در اولین نوشتن هدر را اضافه کن
-                    writer.writeheader()
-                writer.writerow(results[-1])
+def process_usernames(input_index, sessions, output_file, journal, count, config_file, metrics):
+    start_index = journal.next_index
+    if not sessions:
+        logging.error("هیچ سشن معتبری برای پردازش موجود نیست.")
+        return start_index  # بازگشت به ایندکس شروع در صورت نبود سشن معتبر
 
-        # به‌روزرسانی فایل کانفیگ پس از هر پردازش موفق
-        config_file["last_processed_index"] = i + 1
-        update_config("config.json", config_file)
+    end_index = min(start_index + count, len(input_index))
+
+    # فقط سطرهای همین دسته از فایل ورودی خوانده می‌شوند و اعتبارسنجی هم همین‌جا به‌صورت تنبل انجام می‌شود
+    rows = []
+    for i, row in input_index.read_rows(start_index, end_index - start_index):
+        if journal.is_done(i):
+            continue  # لینک‌هایی که در اجرای قبلی خارج از ترتیب تمام شده‌اند دوباره پردازش نمی‌شوند
+        parsed = parse_input_row(row)
+        if parsed is None:
+            logging.warning(f"سطر ناقص یافت شد و نادیده گرفته شد: {row}")
+            journal.record(i, "invalid", "")
+            continue
+        rows.append((i, *parsed))
+
+    # هر نام کاربری یکتا فقط یک بار دریافت و نتیجه‌اش برای همه سطرهای مربوط تکرار می‌شود
+    plan, invalid_links = plan_batch(rows)
+    for i in invalid_links:
+        logging.warning(f"لینک سطر {i} نام کاربری معتبر ندارد و نادیده گرفته شد.")
+        journal.record(i, "invalid", "")
+
+    # صف مشترک کار؛ هر سشن فعال یک نخ جداگانه دارد که از این صف برمی‌دارد
+    work_queue = queue.Queue()
+    for username, targets in plan.items():
+        work_queue.put((username, targets))
+
+    state = {
+        "lock": threading.Lock(),
+        "attempts": {},
+        "end_index": end_index,
+        "deadline": config_file.get("request_deadline", 20),
+    }
+
+    # ژورنال پس از هر نوشتن دسته روی دیسک ثبت می‌شود تا هرگز جلوتر از خروجی نباشد
+    writer = ResultWriter(
+        output_file,
+        OUTPUT_FIELDNAMES,
+        batch_size=config_file.get("output_batch_size", 50),
+        flush_interval=config_file.get("output_flush_interval", 10),
+        on_flush=journal.commit,
+        observe=metrics.observe_write,
+    )
+
+    # کش ماندگار پروفایل‌ها تا یک نام کاربری تکراری یا اجرای دوباره پس از قطعی سهمیه سشن مصرف نکند
+    cache = ProfileCache(
+        config_file.get("cache_file", "profile_cache.sqlite"),
+        ttl_seconds=config_file.get("cache_ttl_hours", 168) * 3600,
+        max_entries=config_file.get("cache_max_entries", 500000),
+    )
+
+    # هر سشن محدودکننده نرخ خودش را دارد و به‌جای تاخیر ثابت با آن تنظیم می‌شود
+    limiters = create_rate_limiters(sessions, config_file)
+    watchdog = DeadlineWatchdog()
+
+    workers = []
+    for worker_number, (session_entry, limiter) in enumerate(zip(sessions, limiters), start=1):
+        worker = threading.Thread(
+            target=session_worker,
+            args=(worker_number, session_entry, limiter, work_queue, writer, journal, cache, watchdog, metrics, state),
+            name=f"session-{worker_number}",
+            daemon=True,
+        )
+        worker.start()
+        workers.append(worker)
+    logging.info(f"{len(workers)} کارگر برای {work_queue.qsize()} نام کاربری راه‌اندازی شد.")
+    metrics.start(queue_depth=work_queue.qsize)
+
+    try:
+        for worker in workers:
+            worker.join()
+    finally:
+        writer.close()  # نوشتن باقی‌مانده بافر حتی در صورت توقف
+        cache.close()  # گزارش تعداد برخورد و عدم برخورد کش در لاگ
+
+    # علامت لینک‌های ناموفق در فایل جانبی ثبت می‌شود و فایل ورودی دست نمی‌خورد
+    new_failed = mark_failed(input_index.input_file, journal.failed_indices())
+    if new_failed:
+        logging.warning(f"تعداد لینک‌های ناموفق جدید: {len(new_failed)}")
 
     logging.info(f"نتایج در فایل {output_file} ذخیره شد.")
-    return end_index  # برگرداندن ایندکس آخرین پروفایل پردازش شده
+    return journal.next_index  # برگرداندن ایندکس اولین لینک پردازش‌نشده
 
 def main():
     config_file = "config.json"  # فایل کانفیگ
@@ -193,38 +294,39 @@ def main():
 
     session_data = config["sessions"]
     max_active_sessions = config.get("max_active_sessions", 5)
-    sessions = create_sessions(session_data, max_active_sessions)
+    # متریک‌ها به‌صورت دوره‌ای در فایل JSON lines نوشته می‌شوند تا ui.py آن‌ها را نمایش دهد
+    metrics = ScraperMetrics(config.get("metrics_file", "metrics.jsonl"), config.get("metrics_interval", 15))
+
+    timeout = (config.get("connect_timeout", 5), config.get("read_timeout", 10))
+    started = time.perf_counter()
+    sessions = create_sessions(session_data, max_active_sessions, timeout)
+    metrics.observe_setup(time.perf_counter() - started)
 
     # دریافت تنظیمات اولیه
     input_file = config["input_file"]
     output_file = config["output_file"]
-    delay = config["delay"]
     count = config["count"]
 
-    # بررسی فایل ورودی
-    validate_input_file(input_file)
-
-    # خواندن لینک‌ها، دسته‌بندی و شهر از فایل CSV
-    links = []
-    categories_and_cities = []  # اینجا دسته‌بندی و شهرها ذخیره می‌شوند
-    with open(input_file, 'r', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        next(reader, None)  # رد کردن سطر هدر
-        for row in reader:
-            links.append(row[0])  # لینک پروفایل در ستون اول
-            category = row[1] if len(row) > 1 else ""
-            city = row[2] if len(row) > 2 else ""
-            categories_and_cities.append((category, city))
+    # ایندکس آفست فایل ورودی؛ فقط بخش جدید فایل اسکن می‌شود و کل فایل در حافظه بارگذاری نمی‌شود
+    input_index = InputIndex(input_file, stride=config.get("input_index_stride", 1000))
 
-    # پردازش لینک‌ها
-    start_index = config.get("last_processed_index", 0)
-    last_processed = process_usernames(links, sessions, output_file, start_index, count, categories_and_cities, delay, config)
+    # وضعیت پیشرفت از ژورنال خوانده می‌شود؛ last_processed_index کانفیگ فقط برای اولین اجرا استفاده می‌شود
+    # و اسکریپت دیگر config.json را بازنویسی نمی‌کند تا با ویرایشگر ui.py تداخل نداشته باشد
+    journal = ProgressJournal(
+        config.get("journal_file", "progress.journal"),
+        config.get("checkpoint_file", "progress.checkpoint.json"),
+        default_index=config.get("last_processed_index", 0),
+        compact_every=config.get("journal_compact_every", 1000),
+    )
 
-    # به‌روزرسانی کانفیگ با ایندکس جدید
-    config["last_processed_index"] = last_processed
-    update_config(config_file, config)
+    # پردازش لینک‌ها
+    try:
+        last_processed = process_usernames(input_index, sessions, output_file, journal, count, config, metrics)
+    finally:
+        journal.close()
+        metrics.close()
 
-    logging.info(f"پردازش تا لینک شماره {last_processed} از {len(links)} انجام شد.")
+    logging.info(f"پردازش تا لینک شماره {last_processed} از {len(input_index)} انجام شد.")
 
 if __name__ == "__main__":
     main()
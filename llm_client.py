@@ -0,0 +1,234 @@
+import json
+import time
+import random
+import threading
+import email.utils
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# آدرس پایه AvalAI؛ برای آزمایش با سرور محلی قابل تغییر است
+DEFAULT_BASE_URL = "https://api.avalai.ir"
+CHAT_PATH = "/v1/chat/completions"
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_MAX_TOKENS = 100
+
+# پرامپت سیستم حالت دسته‌ای: چند ردیف در یک درخواست و پاسخ به‌صورت آرایه JSON با شناسه هر ردیف
+BATCH_SYSTEM_PROMPT = (
+    "You are a helpful assistant. The user message is a JSON array of items, each with an \"id\" and a \"prompt\". "
+    "Answer every prompt independently. Reply with only a JSON array containing one object "
+    "{\"id\": <id>, \"result\": <answer text>} per item and no other text."
+)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMRequestError(Exception):
+    """درخواستی که پس از همه تلاش‌ها ناموفق ماند؛ ردیف آن نباید در خروجی نوشته شود"""
+
+
+class MalformedBatchError(LLMRequestError):
+    """پاسخ دسته‌ای که آرایه JSON معتبر نیست؛ دسته کوچک‌تر می‌شود و دوباره ارسال می‌شود"""
+
+
+def estimate_tokens(text):
+    """تخمین تقریبی تعداد توکن (حدود ۴ کاراکتر برای هر توکن)"""
+    return len(text) // 4 + 1
+
+
+def build_batch_prompt(items):
+    """پیام کاربر حالت دسته‌ای از فهرست (شناسه، پرامپت)"""
+    return json.dumps([{"id": str(item_id), "prompt": prompt} for item_id, prompt in items], ensure_ascii=False)
+
+
+def parse_batch_response(content):
+    """تبدیل پاسخ مدل به دیکشنری شناسه (رشته) ← متن پاسخ؛ MalformedBatchError اگر آرایه JSON نباشد"""
+    start, end = content.find("["), content.rfind("]")  # مدل گاهی آرایه را داخل ```json یا متن اضافه می‌گذارد
+    if start < 0 or end < start:
+        raise MalformedBatchError("no JSON array in batch response")
+    try:
+        entries = json.loads(content[start:end + 1])
+    except ValueError as e:
+        raise MalformedBatchError(f"invalid JSON in batch response: {e}")
+    if not isinstance(entries, list):
+        raise MalformedBatchError("batch response is not a list")
+
+    results = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or "id" not in entry or "result" not in entry:
+            continue
+        result = entry["result"]
+        results[str(entry["id"])] = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+    return results
+
+
+def parse_retry_after(value):
+    """تبدیل هدر Retry-After (ثانیه یا تاریخ HTTP) به ثانیه انتظار؛ None اگر قابل خواندن نباشد"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ChatClient:
+    """
+    کلاینت chat completions با یک requests.Session و استخر اتصال به اندازه تعداد درخواست‌های همزمان.
+    پاسخ‌های 429 و 5xx و خطاهای اتصال با تاخیر نمایی (با jitter) دوباره تلاش می‌شوند؛
+    اگر سرور Retry-After بدهد، همه کارگرها تا آن زمان صبر می‌کنند تا سهمیه بیشتر مصرف نشود.
+    observe در صورت وجود برای هر پاسخ موفق با (تاخیر به ثانیه، فیلد usage پاسخ) صدا زده می‌شود.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, max_in_flight=8, max_retries=5,
+                 backoff_base=1.0, max_backoff=60.0, timeout=(10, 60), observe=None):
+        self.chat_url = base_url.rstrip("/") + CHAT_PATH
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.observe = observe
+
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.lock = threading.Lock()
+        self.paused_until = 0.0
+
+    def _wait_for_pause(self):
+        with self.lock:
+            wait = self.paused_until - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+    def _pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _backoff(self, attempt):
+        return min(self.max_backoff, self.backoff_base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+    def post(self, payload):
+        """ارسال payload با تلاش مجدد و برگرداندن JSON پاسخ؛ در صورت شکست LLMRequestError"""
+        last_error = None
+        for attempt in range(1, self.max_retries + 1):
+            self._wait_for_pause()
+            started = time.monotonic()
+            try:
+                response = self.session.post(self.chat_url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                last_error = f"connection error: {e}"
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 200:
+                try:
+                    data = response.json()
+                except ValueError:  # پاسخ 200 غیر JSON (مثلاً صفحه خطای HTML پروکسی) مانند خطای گذرا تکرار می‌شود
+                    last_error = f"invalid JSON response: {response.text[:200]}"
+                    time.sleep(self._backoff(attempt))
+                    continue
+                if self.observe:
+                    self.observe(time.monotonic() - started, data.get("usage") or {})
+                return data
+            last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                self._pause(min(retry_after, self.max_backoff))
+            else:
+                time.sleep(self._backoff(attempt))
+        raise LLMRequestError(last_error)
+
+    def complete(self, prompt, model, system_prompt=SYSTEM_PROMPT, temperature=DEFAULT_TEMPERATURE,
+                 max_tokens=DEFAULT_MAX_TOKENS):
+        """متن پاسخ مدل برای یک پرامپت"""
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        data = self.post(payload)
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMRequestError(f"unexpected response: {e}")
+
+    def complete_batch(self, items, model, temperature=DEFAULT_TEMPERATURE, max_tokens_per_item=DEFAULT_MAX_TOKENS):
+        """
+        ارسال چند پرامپت در یک درخواست. items فهرست (شناسه، پرامپت) است؛
+        دیکشنری شناسه ← پاسخ فقط برای شناسه‌هایی که مدل درست برگرداند.
+        """
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": build_batch_prompt(items)},
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens_per_item * len(items),
+        }
+        data = self.post(payload)
+        try:
+            content = data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise MalformedBatchError(f"unexpected response: {e}")
+        answered = parse_batch_response(content)
+        return {item_id: answered[str(item_id)] for item_id, _ in items if str(item_id) in answered}
+
+    def close(self):
+        self.session.close()
+
+
+def complete_rows(client, items, model, max_tokens=DEFAULT_MAX_TOKENS):
+    """
+    پاسخ چند پرامپت با حالت دسته‌ای. دسته‌ای که پاسخش خراب است نصف و دوباره ارسال می‌شود
+    و ردیف‌های جاافتاده از پاسخ نیمه‌کامل در دسته کوچک‌تری تکرار می‌شوند؛ دسته تک‌ردیفی درخواست معمولی است.
+    خروجی (شناسه ← پاسخ، شناسه ← متن خطا) است.
+    """
+    results = {}
+    errors = {}
+    groups = [list(items)]
+    while groups:
+        group = groups.pop()
+        if len(group) == 1:
+            item_id, prompt = group[0]
+            try:
+                results[item_id] = client.complete(prompt, model, max_tokens=max_tokens)
+            except LLMRequestError as e:
+                errors[item_id] = str(e)
+            continue
+
+        try:
+            answered = client.complete_batch(group, model, max_tokens_per_item=max_tokens)
+        except MalformedBatchError:
+            answered = {}
+        except LLMRequestError as e:
+            for item_id, _ in group:
+                errors[item_id] = str(e)
+            continue
+
+        results.update(answered)
+        missing = [item for item in group if item[0] not in answered]
+        if len(missing) == len(group):
+            middle = len(group) // 2
+            groups.append(group[middle:])
+            groups.append(group[:middle])
+        elif missing:
+            groups.append(missing)
+    return results, errors
@@ -0,0 +1,39 @@
+import json
+import logging
+
+from sqlite_cache import SQLiteCache
+
+# ستون‌هایی که به سطر ورودی وابسته‌اند و در کش ذخیره نمی‌شوند
+ROW_FIELDS = ("Category", "City")
+
+
+class ProfileCache(SQLiteCache):
+    """
+    کش ماندگار پروفایل‌ها با کلید نام کاربری.
+    فیلدهای خام پروفایل (بدون دسته‌بندی و شهر) با زمان دریافت ذخیره می‌شوند.
+    """
+
+    TABLE = "profiles"
+    KEY_COLUMN = "username"
+    VALUE_COLUMN = "data"
+    CREATED_COLUMN = "fetched_at"
+
+    def __init__(self, db_file, ttl_seconds=7 * 24 * 3600, max_entries=500000):
+        super().__init__(db_file, ttl_seconds, max_entries)
+
+    def get(self, username):
+        """برگرداندن فیلدهای خام پروفایل یا None در صورت نبودن یا منقضی بودن"""
+        payload = super().get(username.lower())
+        return json.loads(payload) if payload is not None else None
+
+    def put(self, username, data):
+        """ذخیره فیلدهای خام پروفایل بدون ستون‌های وابسته به سطر ورودی"""
+        payload = json.dumps({k: v for k, v in data.items() if k not in ROW_FIELDS}, ensure_ascii=False)
+        super().put(username.lower(), payload)
+
+    def log_stats(self):
+        logging.info(f"کش پروفایل: {self.hits} برخورد، {self.misses} عدم برخورد ({self.hit_ratio():.1f}٪ برخورد).")
+
+    def close(self):
+        super().close()
+        self.log_stats()
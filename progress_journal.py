@@ -0,0 +1,125 @@
+import os
+import json
+import logging
+import threading
+
+
+def load_progress(journal_file, checkpoint_file, default_index=0):
+    """
+    بازسازی وضعیت پیشرفت از چک‌پوینت و ژورنال بدون هیچ نوشتنی.
+    خروجی: (ایندکس پیوسته بعدی، مجموعه ایندکس‌های تمام‌شده بعد از آن، دیکشنری ایندکس‌های ناموفق)
+    """
+    next_index = default_index
+    done = set()
+    failed = {}
+
+    if os.path.exists(checkpoint_file):
+        with open(checkpoint_file, 'r', encoding='utf-8') as file:
+            checkpoint = json.load(file)
+        next_index = checkpoint.get("next_index", default_index)
+        done = set(checkpoint.get("done_after", []))
+        failed = {int(index): tag for index, tag in checkpoint.get("failed", {}).items()}
+
+    if os.path.exists(journal_file):
+        with open(journal_file, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # خط ناقص انتهای ژورنال (مثلاً پس از قطع برق) نادیده گرفته می‌شود
+                    continue
+                index = entry["index"]
+                if entry["status"] == "failed":
+                    failed[index] = entry.get("tag", "")
+                else:
+                    failed.pop(index, None)
+                if index >= next_index:
+                    done.add(index)
+
+    while next_index in done:
+        done.remove(next_index)
+        next_index += 1
+    return next_index, done, failed
+
+
+class ProgressJournal:
+    """
+    ژورنال فقط-افزودنی پیشرفت پردازش (ایندکس، وضعیت، تگ سشن) با فشرده‌سازی دوره‌ای در یک چک‌پوینت.
+    چون کارگرها خارج از ترتیب تمام می‌کنند، علاوه بر ایندکس پیوسته، ایندکس‌های تمام‌شده بعد از آن هم نگه‌داری می‌شوند
+    تا ادامه کار دقیقاً بدون پردازش دوباره یا جا انداختن سطرها انجام شود.
+    """
+
+    def __init__(self, journal_file, checkpoint_file, default_index=0, compact_every=1000):
+        self.journal_file = journal_file
+        self.checkpoint_file = checkpoint_file
+        self.compact_every = compact_every
+
+        self.next_index, self.done, self.failed = load_progress(journal_file, checkpoint_file, default_index)
+        self.pending = []
+        self.entries_since_compaction = 0
+        self.lock = threading.Lock()
+        self.file = open(journal_file, 'a', encoding='utf-8')
+
+    def is_done(self, index):
+        with self.lock:
+            return index < self.next_index or index in self.done
+
+    def record(self, index, status, tag):
+        """ثبت نتیجه یک ایندکس؛ تا فراخوانی commit فقط در حافظه می‌ماند"""
+        with self.lock:
+            self.pending.append({"index": index, "status": status, "tag": tag})
+
+    def commit(self):
+        """افزودن نتایج در انتظار به ژورنال و به‌روزرسانی وضعیت پیوسته"""
+        with self.lock:
+            if not self.pending:
+                return
+            for entry in self.pending:
+                self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                index = entry["index"]
+                if entry["status"] == "failed":
+                    self.failed[index] = entry["tag"]
+                else:
+                    self.failed.pop(index, None)
+                if index >= self.next_index:
+                    self.done.add(index)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+            self.entries_since_compaction += len(self.pending)
+            self.pending = []
+            while self.next_index in self.done:
+                self.done.remove(self.next_index)
+                self.next_index += 1
+
+            if self.entries_since_compaction >= self.compact_every:
+                self._compact_locked()
+
+    def _compact_locked(self):
+        checkpoint = {
+            "next_index": self.next_index,
+            "done_after": sorted(self.done),
+            "failed": {str(index): tag for index, tag in sorted(self.failed.items())},
+        }
+        temp_file = f"{self.checkpoint_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(checkpoint, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, self.checkpoint_file)  # جایگزینی اتمی چک‌پوینت
+
+        # ژورنال فقط پس از ذخیره امن چک‌پوینت خالی می‌شود
+        self.file.close()
+        self.file = open(self.journal_file, 'w', encoding='utf-8')
+        self.entries_since_compaction = 0
+        logging.info(f"ژورنال پیشرفت در چک‌پوینت فشرده شد (ایندکس بعدی: {self.next_index}).")
+
+    def failed_indices(self):
+        with self.lock:
+            return sorted(self.failed)
+
+    def close(self):
+        self.commit()
+        with self.lock:
+            self._compact_locked()
+            self.file.close()
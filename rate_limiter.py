@@ -0,0 +1,95 @@
+import time
+import logging
+import threading
+
+
+class SessionRateLimiter:
+    """
+    سطل توکن برای یک سشن اینستاگرام با تنظیم تطبیقی نرخ (AIMD).
+    هر درخواست موفق نرخ را کمی بالا می‌برد، هر خطای 429 یا اتصال نرخ را نصف می‌کند
+    و در صورت نیاز سشن را برای مدتی در حالت خنک‌سازی قرار می‌دهد؛ پس از آن سشن خودکار برمی‌گردد.
+    """
+
+    def __init__(self, tag, rate_per_minute, min_per_minute=1.0, max_per_minute=None, burst=1,
+                 increase_per_success=0.5, decrease_factor=0.5, cooldown_seconds=300, max_cooldown_seconds=3600):
+        self.tag = tag
+        self.rate = rate_per_minute / 60.0
+        self.min_rate = min_per_minute / 60.0
+        self.max_rate = (max_per_minute or rate_per_minute * 2) / 60.0
+        self.burst = burst
+        self.increase = increase_per_success / 60.0
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.cooldown_until = 0.0
+        self.strikes = 0  # تعداد خطاهای پشت سر هم برای افزایش نمایی زمان خنک‌سازی
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """انتظار تا زمانی که سشن از خنک‌سازی خارج شده و توکن آزاد داشته باشد"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.cooldown_until:
+                    wait = self.cooldown_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def record_success(self):
+        """افزایش جمعی نرخ پس از درخواست موفق"""
+        with self.lock:
+            self.strikes = 0
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def record_failure(self, cool_down=False):
+        """کاهش ضربی نرخ و در صورت نیاز قرار دادن سشن در حالت خنک‌سازی"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            if not cool_down:
+                return
+            self.strikes += 1
+            duration = min(self.max_cooldown_seconds, self.cooldown_seconds * 2 ** (self.strikes - 1))
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + duration)
+            self.tokens = 0.0
+        logging.warning(f"سشن {self.tag} به مدت {duration:.0f} ثانیه در حالت خنک‌سازی قرار گرفت "
+                        f"(نرخ جدید: {self.rate * 60:.2f} درخواست در دقیقه).")
+
+    def is_cooling_down(self):
+        with self.lock:
+            return time.monotonic() < self.cooldown_until
+
+    def rate_per_minute(self):
+        with self.lock:
+            return self.rate * 60
+
+
+def create_rate_limiters(sessions, config):
+    """ساخت یک محدودکننده نرخ برای هر سشن فعال بر اساس تنظیمات کانفیگ"""
+    delay = config.get("delay", 5) or 1
+    options = config.get("rate_limit", {})
+    limiters = []
+    for _, tag, _ in sessions:
+        limiters.append(SessionRateLimiter(
+            tag,
+            rate_per_minute=options.get("initial_per_minute", 60.0 / delay),
+            min_per_minute=options.get("min_per_minute", 1.0),
+            max_per_minute=options.get("max_per_minute"),
+            burst=options.get("burst", 1),
+            increase_per_success=options.get("increase_per_success", 0.5),
+            decrease_factor=options.get("decrease_factor", 0.5),
+            cooldown_seconds=options.get("cooldown_seconds", 300),
+            max_cooldown_seconds=options.get("max_cooldown_seconds", 3600),
+        ))
+    return limiters
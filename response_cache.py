@@ -0,0 +1,29 @@
+import json
+import hashlib
+
+from sqlite_cache import SQLiteCache
+
+
+def cache_key(model, system_prompt, prompt, temperature, max_tokens):
+    """هش SHA-256 همه ورودی‌هایی که پاسخ مدل به آن‌ها بستگی دارد"""
+    material = json.dumps([model, system_prompt, prompt, temperature, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(SQLiteCache):
+    """
+    کش ماندگار پاسخ‌های مدل با کلید هش (مدل، پرامپت سیستم، پرامپت نهایی، temperature، max_tokens).
+    بیوهای تکراری با برخورد کش بدون درخواست به API پاسخ می‌گیرند.
+    """
+
+    TABLE = "responses"
+    KEY_COLUMN = "key"
+    VALUE_COLUMN = "response"
+    CREATED_COLUMN = "created_at"
+
+    def __init__(self, db_file, ttl_seconds=30 * 24 * 3600, max_entries=200000):
+        super().__init__(db_file, ttl_seconds, max_entries)
+
+    def stats_text(self):
+        total = self.hits + self.misses
+        return f"کش پاسخ: {self.hits} برخورد از {total} ({self.hit_ratio():.1f}٪)، {self.size()} پاسخ ذخیره‌شده"
@@ -0,0 +1,83 @@
+import os
+import csv
+import time
+import logging
+import threading
+
+
+class ResultWriter:
+    """
+    نویسنده ماندگار فایل خروجی CSV با ستون‌های ثابت.
+    ردیف‌ها در حافظه جمع می‌شوند و به‌صورت دسته‌ای، در بازه‌های زمانی مشخص و هنگام بستن نوشته می‌شوند.
+    هدر فقط یک بار و فقط وقتی فایل خالی است نوشته می‌شود. فراخوانی از چند نخ مجاز است.
+    تابع on_flush پس از هر بار نوشتن روی دیسک صدا زده می‌شود تا وضعیت پیشرفت همگام ذخیره شود
+    و تابع observe (در صورت وجود) تعداد ردیف‌ها و زمان هر نوشتن را دریافت می‌کند.
+    """
+
+    def __init__(self, output_file, fieldnames, batch_size=50, flush_interval=10.0, on_flush=None, observe=None):
+        self.output_file = output_file
+        self.fieldnames = list(fieldnames)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.observe = observe
+
+        self.buffer = []
+        self.rows_written = 0
+        self.lock = threading.Lock()
+
+        needs_header = not os.path.exists(output_file) or os.path.getsize(output_file) == 0
+        self.file = open(output_file, 'a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+        if needs_header:
+            self.writer.writeheader()
+            self.file.flush()
+
+        # نخ پس‌زمینه برای خالی کردن بافر در بازه‌های زمانی ثابت
+        self.closed = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_periodically, name="result-writer", daemon=True)
+        self.flusher.start()
+
+    def write(self, row):
+        """افزودن یک ردیف به بافر و نوشتن دسته در صورت پر شدن"""
+        with self.lock:
+            self.buffer.append(row)
+            if len(self.buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self.buffer:
+            started = time.perf_counter()
+            self.writer.writerows(self.buffer)
+            self.file.flush()
+            if self.observe:
+                self.observe(len(self.buffer), time.perf_counter() - started)
+            self.rows_written += len(self.buffer)
+            self.buffer = []
+        if self.on_flush:
+            self.on_flush()
+
+    def _flush_periodically(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """نوشتن باقی‌مانده بافر و بستن فایل"""
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.flusher.join()
+        with self.lock:
+            self._flush_locked()
+            self.file.close()
+        logging.info(f"{self.rows_written} ردیف در فایل {self.output_file} نوشته شد.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
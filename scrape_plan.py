@@ -0,0 +1,48 @@
+import logging
+from urllib.parse import urlsplit
+
+# بخش‌هایی از مسیر اینستاگرام که نام کاربری نیستند
+RESERVED_PATHS = {"p", "reel", "reels", "stories", "explore", "tv", "accounts"}
+
+
+def canonical_username(link):
+    """
+    استخراج نام کاربری استاندارد از لینک پروفایل.
+    حروف کوچک می‌شوند و کوئری، فرگمنت، اسلش انتهایی و نبودن scheme تفاوتی ایجاد نمی‌کنند.
+    برای لینک بدون نام کاربری معتبر None برمی‌گرداند.
+    """
+    link = link.strip()
+    if "://" not in link:
+        link = f"https://{link}"
+    parts = urlsplit(link)
+    segments = [segment for segment in parts.path.split('/') if segment]
+    if not segments:
+        return None
+    username = segments[0].lstrip('@').lower()
+    if not username or username in RESERVED_PATHS:
+        return None
+    return username
+
+
+def plan_batch(rows):
+    """
+    گروه‌بندی سطرهای یک دسته بر اساس نام کاربری استاندارد تا هر نام کاربری فقط یک بار دریافت شود.
+    ورودی: (ایندکس، لینک، دسته‌بندی، شهر). خروجی: (دیکشنری نام کاربری ← فهرست (ایندکس، دسته‌بندی، شهر)، ایندکس‌های نامعتبر)
+    """
+    plan = {}
+    invalid = []
+    row_count = 0
+    for i, link, category, city in rows:
+        row_count += 1
+        username = canonical_username(link)
+        if username is None:
+            invalid.append(i)
+            continue
+        plan.setdefault(username, []).append((i, category, city))
+
+    valid_rows = row_count - len(invalid)
+    if valid_rows:
+        saved = valid_rows - len(plan)
+        logging.info(f"برنامه‌ریزی دسته: {valid_rows} سطر به {len(plan)} نام کاربری یکتا تبدیل شد "
+                     f"({saved} درخواست تکراری حذف شد، {saved / valid_rows * 100:.1f}٪).")
+    return plan, invalid
@@ -0,0 +1,172 @@
+import json
+import time
+import threading
+from collections import deque
+
+# مرزهای بالای سطل‌های هیستوگرام تاخیر (ثانیه)، مشابه هیستوگرام‌های Prometheus
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, float("inf"))
+
+
+class Histogram:
+    """هیستوگرام ساده با سطل‌های ثابت برای تاخیر درخواست‌ها"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """تخمین چندک از روی مرز بالای سطل"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            "buckets": {("+Inf" if bound == float("inf") else str(bound)): count for bound, count in zip(self.buckets, self.counts)},
+            "sum": round(self.total, 3),
+            "count": self.count,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+
+class MetricsExporter:
+    """
+    پایه متریک‌هایی که در فایل JSON lines نوشته می‌شوند: یک نخ پس‌زمینه در بازه‌های ثابت
+    خروجی snapshot زیرکلاس را به‌صورت یک خط JSON به فایل متریک اضافه می‌کند.
+    """
+
+    thread_name = "metrics-exporter"
+
+    def __init__(self, metrics_file, export_interval):
+        self.metrics_file = metrics_file
+        self.export_interval = export_interval
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.closed = threading.Event()
+        self.exporter = None
+
+    def snapshot(self):
+        raise NotImplementedError
+
+    def export(self):
+        """افزودن یک خط JSON با وضعیت فعلی به فایل متریک"""
+        line = json.dumps(self.snapshot(), ensure_ascii=False)
+        with open(self.metrics_file, 'a', encoding='utf-8') as file:
+            file.write(line + "\n")
+
+    def start(self):
+        self.exporter = threading.Thread(target=self._export_periodically, name=self.thread_name, daemon=True)
+        self.exporter.start()
+
+    def _export_periodically(self):
+        while not self.closed.wait(self.export_interval):
+            self.export()
+
+    def close(self):
+        self.closed.set()
+        if self.exporter:
+            self.exporter.join()
+        self.export()
+
+
+class ScraperMetrics(MetricsExporter):
+    """
+    جمع‌آوری متریک‌های مسیر اصلی اسکریپر: هیستوگرام تاخیر هر سشن، شمارنده نتایج، نرخ پروفایل در دقیقه،
+    طول صف و زمان نوشتن روی دیسک.
+    """
+
+    def __init__(self, metrics_file, export_interval=15.0):
+        super().__init__(metrics_file, export_interval)
+        self.sessions = {}
+        self.completions = deque()  # زمان اتمام پروفایل‌ها در یک دقیقه اخیر
+        self.write_latency = Histogram()
+        self.rows_written = 0
+        self.setup_seconds = None
+        self.queue_depth = lambda: 0
+
+    def _session(self, tag):
+        if tag not in self.sessions:
+            self.sessions[tag] = {
+                "latency": Histogram(),
+                "counters": {"success": 0, "not_found": 0, "error": 0, "cached": 0},
+            }
+        return self.sessions[tag]
+
+    def observe_request(self, tag, seconds, outcome):
+        """ثبت تاخیر و نتیجه یک درخواست (success، not_found یا error)"""
+        with self.lock:
+            session = self._session(tag)
+            session["latency"].observe(seconds)
+            session["counters"][outcome] += 1
+            self.completions.append(time.time())
+
+    def observe_cached(self, tag):
+        with self.lock:
+            self._session(tag)["counters"]["cached"] += 1
+            self.completions.append(time.time())
+
+    def observe_write(self, rows, seconds):
+        with self.lock:
+            self.write_latency.observe(seconds)
+            self.rows_written += rows
+
+    def observe_setup(self, seconds):
+        """زمان ساخت سشن‌ها (create_sessions)"""
+        with self.lock:
+            self.setup_seconds = round(seconds, 3)
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            while self.completions and now - self.completions[0] > 60:
+                self.completions.popleft()
+            return {
+                "time": round(now, 3),
+                "uptime_seconds": round(now - self.started_at, 1),
+                "profiles_per_minute": len(self.completions),
+                "queue_depth": self.queue_depth(),
+                "session_setup_seconds": self.setup_seconds,
+                "rows_written": self.rows_written,
+                "write_latency": self.write_latency.snapshot(),
+                "sessions": {
+                    tag: {"latency": session["latency"].snapshot(), **session["counters"]}
+                    for tag, session in self.sessions.items()
+                },
+            }
+
+    def start(self, queue_depth=None):
+        if queue_depth is not None:
+            self.queue_depth = queue_depth
+        super().start()
+
+
+def read_latest_metrics(metrics_file, max_line_bytes=65536):
+    """خواندن آخرین خط فایل متریک بدون خواندن کل فایل"""
+    with open(metrics_file, 'rb') as file:
+        file.seek(0, 2)
+        size = file.tell()
+        file.seek(max(0, size - max_line_bytes))
+        lines = file.read().splitlines()
+    for line in reversed(lines):
+        try:
+            return json.loads(line.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+    return None
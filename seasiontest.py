@@ -1,9 +1,10 @@
 import json
 import logging
 
-import instaloader
 from instaloader import Profile, ConnectionException, LoginRequiredException, QueryReturnedNotFoundException
 
+from session_pool import create_loader
+
 logging.basicConfig(
     filename="session_validation.log",
     level=logging.INFO,
@@ -74,11 +75,8 @@ def test_session_by_followers(session_id):
     اگر موفق شد، یعنی سشن معتبر است؛ در غیر این صورت، نامعتبر.
     """
     try:
-        L = instaloader.Instaloader()
-
-        # کوکی sessionid را داخل سشن Instaloader می‌گذاریم.
-        # دقت کنید domain باید '.instagram.com' باشد.
-        L.context._session.cookies.set("sessionid", session_id, domain=".instagram.com", path="/")
+        # Instaloader با کوکی sessionid و استخر اتصال مشترک با اسکریپت اصلی ساخته می‌شود.
+        L = create_loader(session_id, max_connection_attempts=3)
 
         # حالا می‌خواهیم اطلاعات پروفایل TARGET_USERNAME را بگیریم
         profile = Profile.from_username(L.context, TARGET_USERNAME)
@@ -0,0 +1,137 @@
+import socket
+import weakref
+import threading
+
+import instaloader
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# اندازه استخر اتصال هر سشن؛ هر سشن یک کارگر دارد ولی Instaloader گاهی چند میزبان را صدا می‌زند
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 8
+
+# تایم‌اوت پیش‌فرض (اتصال، خواندن) به ثانیه برای هر عملیات سوکت
+DEFAULT_TIMEOUT = (5, 10)
+
+
+class SessionRateController(instaloader.RateController):
+    """
+    کنترل‌کننده نرخ بی‌اثر برای Instaloader ماندگار. کنترل‌کننده پیش‌فرض در هر context فقط ۷۵ درخواست
+    در ۱۱ دقیقه اجازه می‌دهد و پس از آن ۶۶۶ ثانیه می‌خوابد؛ فاصله درخواست‌ها با SessionRateLimiter تنظیم می‌شود.
+    """
+
+    def wait_before_query(self, query_type):
+        pass
+
+    def handle_429(self, query_type):
+        pass
+
+
+class _TrackingPoolMixin:
+    """ثبت اتصال‌های در حال استفاده استخر تا درخواست گیرکرده از نخ دیگری (ناظر مهلت) قطع شود"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active_connections = weakref.WeakSet()
+        self.active_lock = threading.Lock()
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        with self.active_lock:
+            self.active_connections.add(conn)
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            with self.active_lock:
+                self.active_connections.discard(conn)
+        super()._put_conn(conn)
+
+    def abort(self):
+        with self.active_lock:
+            connections = list(self.active_connections)
+        for conn in connections:
+            sock = getattr(conn, "sock", None)
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)  # خواندن مسدودشده فوراً با خطای اتصال برمی‌گردد
+            except OSError:
+                pass
+
+
+class TrackingHTTPConnectionPool(_TrackingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class TrackingHTTPSConnectionPool(_TrackingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class AbortableAdapter(HTTPAdapter):
+    """HTTPAdapter با استخرهایی که اتصال‌های فعالشان را می‌شناسند؛ abort همه درخواست‌های در جریان را قطع می‌کند"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TrackingHTTPConnectionPool,
+            "https": TrackingHTTPSConnectionPool,
+        }
+
+    def close(self):
+        # آداپتر بین سشن‌های کوتاه‌عمری که Instaloader پس از هر درخواست می‌بندد مشترک است؛ استخر باز می‌ماند
+        pass
+
+    def abort(self):
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                pool.abort()
+
+
+def abort_requests(loader):
+    """
+    قطع درخواست‌های در جریان Instaloader با بستن سوکت‌های فعال آن؛ درخواست با ConnectionException تمام می‌شود.
+    همان آداپتر روی سشن اصلی و سشن‌های ناشناس درخواست صفحه نصب است، پس درخواست واقعی پروفایل هم قطع می‌شود؛
+    فقط سشن‌های کپی‌شده (copy_session در پرس‌وجوهای GraphQL) به تایم‌اوت هر عملیات سوکت محدودند.
+    """
+    for adapter in set(loader.context._session.adapters.values()):
+        if isinstance(adapter, AbortableAdapter):
+            adapter.abort()
+
+
+def create_loader(session_id, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_connection_attempts=1,
+                  timeout=DEFAULT_TIMEOUT):
+    """
+    ساخت یک Instaloader ماندگار برای یک session_id.
+    کوکی sessionid داخل سشن خود Instaloader قرار می‌گیرد (تا هدرهای پیش‌فرض آن حفظ شود)
+    و یک HTTPAdapter با استخر اتصال keep-alive روی آن و روی سشن‌های ناشناسی که Instaloader برای هر درخواست صفحه
+    می‌سازد نصب می‌شود تا اتصال TLS بین پروفایل‌ها دوباره استفاده شود.
+    همه درخواست‌های سشن تایم‌اوت اتصال و خواندن دارند تا درخواست گیرکرده واقعاً قطع شود.
+    """
+    # request_timeout روی همه درخواست‌های سشن Instaloader (و نسخه‌های کپی‌شده آن) اعمال می‌شود؛ requests تاپل (اتصال، خواندن) را هم می‌پذیرد
+    # خواب تصادفی پیش از هر درخواست و کنترل‌کننده نرخ داخلی خاموش‌اند؛ نرخ هر سشن را SessionRateLimiter تعیین می‌کند
+    loader = instaloader.Instaloader(sleep=False, max_connection_attempts=max_connection_attempts, request_timeout=timeout,
+                                     rate_controller=SessionRateController)
+    session = loader.context._session
+    session.cookies.set("sessionid", None)  # حذف کوکی خالی پیش‌فرض سشن ناشناس
+    session.cookies.set("sessionid", session_id, domain=".instagram.com", path="/")
+
+    # تلاش مجدد در سطح urllib3 خاموش است؛ تلاش مجدد و کاهش نرخ با محدودکننده نرخ انجام می‌شود
+    adapter = AbortableAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    # Profile.from_username صفحه پروفایل را با get_page_data از یک سشن ناشناس تازه در هر فراخوانی می‌خواند؛
+    # همان آداپتر روی آن سشن‌ها هم نصب می‌شود تا مسیر واقعی درخواست از استخر اتصال استفاده کند
+    new_anonymous_session = loader.context.get_anonymous_session
+
+    def pooled_anonymous_session():
+        anonymous = new_anonymous_session()
+        anonymous.mount("https://", adapter)
+        anonymous.mount("http://", adapter)
+        return anonymous
+
+    loader.context.get_anonymous_session = pooled_anonymous_session
+    return loader
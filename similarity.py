@@ -0,0 +1,291 @@
+import os
+import re
+import json
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# تشخیص پروفایل‌های تقریباً تکراری در out.csv با MinHash و LSH بر اساس configai.json.
+# متن نرمال‌شده نام، بیو و شماره تماس هر ردیف به شینگل‌های کاراکتری تبدیل و امضای MinHash آن ساخته می‌شود؛
+# فقط ردیف‌هایی که دست‌کم در یک باند LSH هم‌سطل باشند مقایسه می‌شوند، پس هزینه زیرمربعی است.
+# شناسه خوشه (شماره کوچک‌ترین ردیف خوشه) در ستون similarity_column یک فایل جانبی (row، شناسه خوشه) نوشته می‌شود؛
+# out.csv فقط خوانده می‌شود، چون خروجی زنده ResultWriter اسکریپر است و جایگزین کردن آن ردیف‌های در حال افزودن را از بین می‌برد.
+# امضاها و سطل‌های LSH در یک فایل SQLite می‌مانند تا دسته‌های بعدی با همه ردیف‌های قبلی مقایسه شوند.
+
+config_file = "configai.json"
+
+NUM_PERM = 120
+BANDS = 20  # ۲۰ باند ۶ ردیفی؛ آستانه تقریبی LSH برابر (1/20)^(1/6) ≈ 0.61
+SHINGLE_SIZE = 4
+SIMILARITY_THRESHOLD = 0.6
+INDEX_FILE = "similarity.sqlite"
+CLUSTERS_FILE = "similarity_clusters.csv"
+
+MERSENNE_PRIME = (1 << 31) - 1
+# ضرایب ثابت تا امضای هر ردیف در همه اجراها یکسان بماند
+_random = np.random.RandomState(1)
+PERM_A = _random.randint(1, MERSENNE_PRIME, size=NUM_PERM).astype(np.uint64)
+PERM_B = _random.randint(0, MERSENNE_PRIME, size=NUM_PERM).astype(np.uint64)
+
+# نرمال‌سازی متن فارسی/انگلیسی
+DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+LETTERS = str.maketrans({"ي": "ی", "ى": "ی", "ك": "ک", "ة": "ه", "أ": "ا", "إ": "ا", "آ": "ا", "ؤ": "و", "‌": " "})
+DIACRITICS = re.compile("[ً-ٰٟـ]")  # اعراب و کشیده
+NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_text(text):
+    """یکسان‌سازی حروف عربی/فارسی و ارقام، حذف اعراب، نشانه‌ها و ایموجی‌ها و کوچک کردن حروف لاتین"""
+    if not isinstance(text, str):
+        return ""
+    text = DIACRITICS.sub("", text.translate(DIGITS).translate(LETTERS)).lower()
+    return NON_WORD.sub(" ", text).strip()
+
+
+def row_text(name, bio, phone):
+    phone = re.sub(r"\D", "", normalize_text(phone))
+    return " ".join(part for part in (normalize_text(name), normalize_text(bio), phone) if part)
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """هش CRC32 شینگل‌های کاراکتری یکتا (۳۱ بیتی برای محاسبه در پیمانه اول مرسن)"""
+    if len(text) <= size:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return [zlib.crc32(shingle.encode("utf-8")) & MERSENNE_PRIME for shingle in shingles]
+
+
+def minhash_signatures(texts, size=SHINGLE_SIZE):
+    """
+    امضای MinHash همه متن‌ها به‌صورت برداری: شینگل‌های همه ردیف‌ها در یک آرایه قرار می‌گیرند
+    و کمینه هر جایگشت برای هر ردیف با np.minimum.reduceat گرفته می‌شود. خروجی آرایه (ردیف، NUM_PERM).
+    """
+    hashes = [shingle_hashes(text, size) for text in texts]
+    lengths = np.fromiter((len(h) for h in hashes), dtype=np.int64, count=len(hashes))
+    values = np.fromiter((value for h in hashes for value in h), dtype=np.uint64, count=int(lengths.sum()))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    for perm in range(NUM_PERM):
+        permuted = (PERM_A[perm] * values + PERM_B[perm]) % MERSENNE_PRIME
+        signatures[:, perm] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+
+def band_keys(signature):
+    """کلید ۶۴ بیتی (با علامت، مناسب SQLite) هر باند امضا"""
+    rows = NUM_PERM // BANDS
+    return [
+        int.from_bytes(hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest(),
+                       "big", signed=True)
+        for band in range(BANDS)
+    ]
+
+
+class SimilarityIndex:
+    """نگه‌داری امضای MinHash و سطل‌های LSH ردیف‌های پردازش‌شده در SQLite"""
+
+    def __init__(self, db_file):
+        self.connection = sqlite3.connect(db_file)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS signatures (row INTEGER PRIMARY KEY, signature BLOB NOT NULL)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (band INTEGER, bucket INTEGER, row INTEGER, PRIMARY KEY (band, bucket, row))"
+        )
+        self.connection.commit()
+
+    def __len__(self):
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM signatures").fetchone()
+        return count
+
+    def candidates(self, entries):
+        """
+        زوج‌های (ردیف جدید، ردیف قبلی) که در یک باند هم‌سطل‌اند؛ entries فهرست (باند، سطل، ردیف).
+        مانند سطل‌های داخل دسته، هر ردیف جدید فقط با اولین و آخرین ردیف قبلی هر سطل جفت می‌شود
+        تا کار در سطل‌های بزرگ درجه دوم نشود؛ اجتماع خوشه‌ها بقیه را پوشش می‌دهد.
+        """
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS batch_buckets (band INTEGER, bucket INTEGER, row INTEGER)")
+        self.connection.execute("DELETE FROM batch_buckets")
+        self.connection.executemany("INSERT INTO batch_buckets VALUES (?, ?, ?)", entries)
+        pairs = set()
+        for row, first, last in self.connection.execute(
+            "SELECT n.row, "
+            "(SELECT MIN(b.row) FROM buckets b WHERE b.band = n.band AND b.bucket = n.bucket), "
+            "(SELECT MAX(b.row) FROM buckets b WHERE b.band = n.band AND b.bucket = n.bucket) "
+            "FROM batch_buckets n"
+        ):
+            for other in (first, last):
+                if other is not None and other != row:
+                    pairs.add((row, other))
+        self.connection.execute("DELETE FROM batch_buckets")
+        return pairs
+
+    def signatures(self, rows):
+        result = {}
+        rows = list(rows)
+        for start in range(0, len(rows), 500):
+            chunk = rows[start:start + 500]
+            query = f"SELECT row, signature FROM signatures WHERE row IN ({','.join('?' * len(chunk))})"
+            for row, blob in self.connection.execute(query, chunk):
+                result[row] = np.frombuffer(blob, dtype=np.uint32)
+        return result
+
+    def add(self, rows, signatures, entries):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO signatures (row, signature) VALUES (?, ?)",
+            ((row, signature.tobytes()) for row, signature in zip(rows, signatures)),
+        )
+        self.connection.executemany("INSERT OR IGNORE INTO buckets (band, bucket, row) VALUES (?, ?, ?)", entries)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def find_root(parent, label):
+    while parent.setdefault(label, label) != label:
+        parent[label] = parent[parent[label]]
+        label = parent[label]
+    return label
+
+
+def union(parent, first, second):
+    """ادغام دو خوشه؛ ریشه همیشه شماره کوچک‌تر است تا شناسه خوشه‌ها پایدار بماند"""
+    first, second = find_root(parent, first), find_root(parent, second)
+    if first != second:
+        parent[max(first, second)] = min(first, second)
+
+
+def process_batch(df, index, start, end, config):
+    """
+    پردازش ردیف‌های [start, end) و به‌روزرسانی ستون شباهت df.
+    خروجی (تعداد زوج‌های تأییدشده، ردیف‌ها، امضاها، ورودی‌های سطل) است؛ افزودن به نمایه با فراخواننده است
+    تا پس از ذخیره CSV انجام شود.
+    """
+    similarity_column = config["similarity_column"]
+    threshold = config.get("similarity_threshold", SIMILARITY_THRESHOLD)
+    batch = df.iloc[start:end]
+
+    texts = [
+        row_text(name, bio, phone)
+        for name, bio, phone in zip(batch[config["name_column"]], batch[config["bio_column"]],
+                                    batch[config["business_phone_column"]])
+    ]
+    rows = [row for row, text in zip(range(start, end), texts) if text]
+    texts = [text for text in texts if text]
+    if not rows:
+        return 0, [], [], []
+    signatures = minhash_signatures(texts, config.get("shingle_size", SHINGLE_SIZE))
+    signature_of = dict(zip(rows, signatures))
+
+    entries = [(band, key, row) for row, signature in zip(rows, signatures) for band, key in enumerate(band_keys(signature))]
+
+    # نامزدها: هم‌سطل با ردیف‌های دسته‌های قبلی (از SQLite) و با ردیف‌های همین دسته
+    pairs = set(index.candidates(entries))
+    buckets = {}
+    for band, key, row in entries:
+        buckets.setdefault((band, key), []).append(row)
+    for members in buckets.values():
+        # در سطل‌های بزرگ (مثلاً متن‌های یکسان) هر ردیف فقط با اولین و قبلی خود جفت می‌شود؛ اجتماع خوشه‌ها بقیه را پوشش می‌دهد
+        for position in range(1, len(members)):
+            pairs.add((members[position], members[0]))
+            pairs.add((members[position], members[position - 1]))
+
+    # تأیید نامزدها با شباهت جاکارد تخمینی از امضا تا مثبت‌های کاذب LSH حذف شوند
+    signature_of.update(index.signatures({other for _, other in pairs if other not in signature_of}))
+    confirmed = [
+        (row, other) for row, other in pairs
+        if np.mean(signature_of[row] == signature_of[other]) >= threshold
+    ]
+
+    # برچسب فعلی هر ردیف شناسه خوشه‌اش یا خود شماره ردیف است
+    labels = df[similarity_column]
+    def label(row):
+        value = labels.iat[row]
+        return int(value) if pd.notna(value) else row
+
+    parent = {}
+    for row, other in confirmed:
+        union(parent, label(row), label(other))
+    roots = {old: find_root(parent, old) for old in parent}
+
+    # ادغام برداری خوشه‌های قبلی در ریشه جدید؛ سپس ردیف‌هایی که تازه خوشه‌دار شده‌اند (برچسبشان خود ردیف است)
+    merged = {old: root for old, root in roots.items() if old != root}
+    if merged:
+        existing = labels.isin(list(merged))
+        df.loc[existing, similarity_column] = labels[existing].map(merged)
+    column = df.columns.get_loc(similarity_column)
+    for old, root in roots.items():
+        if pd.isna(df.iat[old, column]):
+            df.iat[old, column] = root
+
+    return len(confirmed), rows, signatures, entries
+
+
+def write_csv_atomic(df, file_path):
+    folder = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix=".csv")
+    os.close(fd)
+    try:
+        df.to_csv(temp_path, index=False)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def save_config(config):
+    with open(config_file, "w") as file:
+        json.dump(config, file, indent=4)
+
+
+def main():
+    with open(config_file, "r") as file:
+        config = json.load(file)
+
+    file_path = config["file_path"]
+    similarity_column = config["similarity_column"]
+    batch_size = config.get("batch_size", 20000)
+    clusters_file = config.get("similarity_file", CLUSTERS_FILE)
+    index = SimilarityIndex(config.get("similarity_index_file", INDEX_FILE))
+
+    start = config.get("last_processed_index", 0)
+    if start and not len(index):
+        # بدون امضای ردیف‌های قبلی مقایسه دسته‌های بعدی ناقص است؛ نمایه از ابتدا ساخته می‌شود
+        print(f"فایل نمایه شباهت خالی است؛ پردازش از ردیف 0 به‌جای {start} شروع می‌شود.")
+        start = 0
+
+    # فقط ستون‌های متن خوانده می‌شوند؛ شماره ردیف‌ها همان شماره ردیف out.csv است
+    columns = [config["name_column"], config["bio_column"], config["business_phone_column"]]
+    df = pd.read_csv(file_path, usecols=columns, dtype=str, keep_default_na=False, na_values=[""])
+    df[similarity_column] = pd.Series(pd.NA, index=df.index, dtype="Int64")
+    if start and os.path.exists(clusters_file):
+        # شناسه‌های خوشه فقط با همین نمایه معنا دارند؛ اجرای از ابتدا فایل جانبی را از نو می‌سازد
+        saved = pd.read_csv(clusters_file, index_col="row")[similarity_column]
+        df[similarity_column] = saved.reindex(df.index).astype("Int64")
+
+    try:
+        while start < len(df):
+            end = min(start + batch_size, len(df))
+            pairs, rows, signatures, entries = process_batch(df, index, start, end, config)
+
+            # ترتیب ذخیره: فایل جانبی خوشه‌ها، سپس نمایه، سپس ایندکس ادامه؛ تکرار یک دسته پس از قطع برنامه بی‌خطر است
+            write_csv_atomic(df[[similarity_column]].rename_axis("row").reset_index(), clusters_file)
+            index.add(rows, signatures, entries)
+            config["last_processed_index"] = end
+            save_config(config)
+
+            clustered = df[similarity_column].notna().sum()
+            print(f"ردیف‌های {start} تا {end} پردازش شد: {pairs} زوج مشابه، {clustered} ردیف در "
+                  f"{df[similarity_column].nunique()} خوشه.")
+            start = end
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
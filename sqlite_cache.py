@@ -0,0 +1,91 @@
+import time
+import sqlite3
+import threading
+
+
+class SQLiteCache:
+    """
+    کش ماندگار کلید ← متن در SQLite، پایه ProfileCache و ResponseCache.
+    ورودی‌های قدیمی‌تر از TTL نادیده گرفته و با رسیدن به سقف تعداد، کم‌استفاده‌ترین‌ها حذف می‌شوند.
+    نام جدول و ستون‌ها در زیرکلاس تعیین می‌شود تا فایل‌های کش موجود همان شِمای قبلی را داشته باشند.
+    """
+
+    TABLE = "cache"
+    KEY_COLUMN = "key"
+    VALUE_COLUMN = "value"
+    CREATED_COLUMN = "created_at"
+    EVICT_EVERY = 1000  # حذف منقضی‌ها و مازاد سقف پس از این تعداد put
+
+    def __init__(self, db_file, ttl_seconds, max_entries):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.puts_since_eviction = 0
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+            f"{self.KEY_COLUMN} TEXT PRIMARY KEY, {self.VALUE_COLUMN} TEXT NOT NULL, "
+            f"{self.CREATED_COLUMN} REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.connection.execute(f"CREATE INDEX IF NOT EXISTS {self.TABLE}_accessed_at ON {self.TABLE} (accessed_at)")
+        self.connection.commit()
+
+    def get(self, key):
+        """متن ذخیره‌شده یا None در صورت نبودن یا منقضی بودن"""
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                f"SELECT {self.VALUE_COLUMN}, {self.CREATED_COLUMN} FROM {self.TABLE} WHERE {self.KEY_COLUMN} = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.connection.execute(f"UPDATE {self.TABLE} SET accessed_at = ? WHERE {self.KEY_COLUMN} = ?", (now, key))
+            self.connection.commit()
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO {self.TABLE} "
+                f"({self.KEY_COLUMN}, {self.VALUE_COLUMN}, {self.CREATED_COLUMN}, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self.connection.commit()
+            self.puts_since_eviction += 1
+            if self.puts_since_eviction >= self.EVICT_EVERY:
+                self._evict_locked()
+
+    def _evict_locked(self):
+        self.puts_since_eviction = 0
+        self.connection.execute(
+            f"DELETE FROM {self.TABLE} WHERE {self.CREATED_COLUMN} < ?", (time.time() - self.ttl_seconds,)
+        )
+        (count,) = self.connection.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()
+        if count > self.max_entries:
+            self.connection.execute(
+                f"DELETE FROM {self.TABLE} WHERE {self.KEY_COLUMN} IN "
+                f"(SELECT {self.KEY_COLUMN} FROM {self.TABLE} ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self.connection.commit()
+
+    def size(self):
+        with self.lock:
+            (count,) = self.connection.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()
+        return count
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total * 100 if total else 0
+
+    def close(self):
+        with self.lock:
+            self._evict_locked()
+            self.connection.close()
@@ -0,0 +1,80 @@
+import os
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow فقط برای مرحله تصویر کوچک لازم است
+    Image = None
+
+
+def transcode(source_path, output_folder, file_name, sizes, quality):
+    """
+    ساخت نسخه‌های کوچک WebP از یک تصویر در یک پردازه جداگانه.
+    خروجی‌هایی که از فایل منبع جدیدتر باشند دوباره ساخته نمی‌شوند. تعداد خروجی‌های ساخته‌شده برگردانده می‌شود.
+    """
+    source_mtime = os.path.getmtime(source_path)
+    targets = []
+    for size in sizes:
+        target = os.path.join(output_folder, str(size), f"{file_name}.webp")
+        if not os.path.exists(target) or os.path.getmtime(target) < source_mtime:
+            targets.append((size, target))
+    if not targets:
+        return 0
+
+    with Image.open(source_path) as image:
+        image = image.convert("RGB")
+        # از بزرگ به کوچک تا هر مرحله از تصویر کوچک‌شده قبلی استفاده کند
+        for size, target in sorted(targets, reverse=True):
+            image.thumbnail((size, size))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            image.save(target, "WEBP", quality=quality, method=4)
+    return len(targets)
+
+
+class Thumbnailer:
+    """مرحله اختیاری پس از دانلود: رمزگشایی، تغییر اندازه و رمزگذاری WebP روی همه هسته‌ها با ProcessPoolExecutor"""
+
+    def __init__(self, output_folder, sizes, quality=80, workers=None):
+        if Image is None:
+            raise RuntimeError("Pillow is required for thumbnail generation: pip install pillow")
+        self.output_folder = output_folder
+        self.sizes = tuple(sizes)
+        self.quality = quality
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        # سقف کارهای در صف تا اگر رمزگذاری از دانلود عقب بماند، دانلود هم آهسته شود
+        self.in_flight = threading.BoundedSemaphore(self.workers * 4)
+        self.lock = threading.Lock()
+        self.images = 0
+        self.outputs = 0
+        self.failed = 0
+        self.started = None
+
+    def submit(self, source_path, file_name):
+        self.in_flight.acquire()
+        with self.lock:
+            if self.started is None:
+                self.started = time.time()
+        future = self.executor.submit(transcode, source_path, self.output_folder, file_name, self.sizes, self.quality)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        self.in_flight.release()
+        with self.lock:
+            try:
+                self.outputs += future.result()
+                self.images += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Thumbnail failed: {e}")
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def report(self):
+        elapsed = time.time() - self.started if self.started else 0
+        rate = self.images / elapsed if elapsed else 0
+        return (f"Thumbnails: {self.images} images, {self.outputs} outputs, {self.failed} failed, "
+                f"{rate:.1f} images/sec ({rate / self.workers:.1f} per core on {self.workers} cores)")
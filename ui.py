@@ -4,10 +4,14 @@ import json
 import os
 import csv
 
+from progress_journal import load_progress
+from scraper_metrics import read_latest_metrics
+
 CONFIG_FILE = "config.json"
 LOG_FILES = ["error.log", "google.log", "script.log"]
 LOG_TAIL_LINES = 20  # Number of lines to display from the end of the log
 LAST_INDEX_FILE = "last_index.txt"  # File containing the Google display value
+METRICS_FILE = "metrics.jsonl"  # Default metrics export of the scraper
 
 class ConfigEditor:
     def __init__(self, root):
@@ -88,7 +92,7 @@ class ConfigEditor:
         self.count_spinbox.insert(0, self.config.get("count", 10))
 
         tk.Label(settings_frame, text="Last Processed Index:").grid(row=2, column=0, sticky="e", padx=5, pady=2)
-        self.last_processed_label = tk.Label(settings_frame, text=self.config.get("last_processed_index", 0))
+        self.last_processed_label = tk.Label(settings_frame, text=self.load_last_processed_index())
         self.last_processed_label.grid(row=2, column=1, padx=5, pady=2)
 
         tk.Label(settings_frame, text="Google Value:").grid(row=3, column=0, sticky="e", padx=5, pady=2)
@@ -109,6 +113,14 @@ class ConfigEditor:
         self.log_selector.bind("<<ListboxSelect>>", self.display_selected_log)
         self.display_selected_log()
 
+        # Scraper Metrics
+        metrics_frame = ttk.LabelFrame(self.root, text="Scraper Metrics")
+        metrics_frame.pack(fill="x", padx=10, pady=5)
+
+        self.metrics_text = tk.Text(metrics_frame, wrap="none", height=8)
+        self.metrics_text.pack(fill="x", expand=True)
+        self.update_metrics()
+
         # Save Button
         save_button = tk.Button(self.root, text="Save Config", command=self.save)
         save_button.pack(pady=5)
@@ -248,6 +260,7 @@ class ConfigEditor:
         self.load_config_data()
         self.load_log()
         self.update_google_value()
+        self.update_metrics()
         self.root.after(5000, self.auto_update)  # Update every 5 seconds
 
     def load_config_data(self):
@@ -263,10 +276,48 @@ class ConfigEditor:
                 self.delay_spinbox.insert(0, self.config.get("delay", 5))
                 self.count_spinbox.delete(0, "end")
                 self.count_spinbox.insert(0, self.config.get("count", 10))
-                self.last_processed_label.config(text=self.config.get("last_processed_index", 0))
+                self.last_processed_label.config(text=self.load_last_processed_index())
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load config: {e}")
 
+    def load_last_processed_index(self):
+        # The scraper records progress in its journal, not in config.json
+        try:
+            next_index, _, _ = load_progress(
+                self.config.get("journal_file", "progress.journal"),
+                self.config.get("checkpoint_file", "progress.checkpoint.json"),
+                default_index=self.config.get("last_processed_index", 0),
+            )
+            return next_index
+        except Exception as e:
+            return f"Error: {e}"
+
+    def format_metrics(self, metrics):
+        lines = [
+            f"Profiles/min: {metrics['profiles_per_minute']}   Queue depth: {metrics['queue_depth']}   "
+            f"Rows written: {metrics['rows_written']}   Session setup: {metrics['session_setup_seconds']}s",
+            f"Write latency p50/p95: {metrics['write_latency']['p50']}s / {metrics['write_latency']['p95']}s",
+        ]
+        for tag, session in metrics["sessions"].items():
+            latency = session["latency"]
+            lines.append(
+                f"{tag}: ok={session['success']} not_found={session['not_found']} error={session['error']} "
+                f"cached={session['cached']} p50={latency['p50']}s p95={latency['p95']}s"
+            )
+        return "\n".join(lines)
+
+    def update_metrics(self):
+        metrics_file = self.config.get("metrics_file", METRICS_FILE)
+        try:
+            metrics = read_latest_metrics(metrics_file)
+            text = self.format_metrics(metrics) if metrics else "No metrics yet."
+        except FileNotFoundError:
+            text = f"Metrics file '{metrics_file}' not found."
+        except Exception as e:
+            text = f"Error: {e}"
+        self.metrics_text.delete("1.0", tk.END)
+        self.metrics_text.insert("1.0", text)
+
     def load_google_value(self):
         try:
             with open(LAST_INDEX_FILE, 'r', encoding='utf-8') as file: